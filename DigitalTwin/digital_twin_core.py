@@ -3,22 +3,69 @@
 # ============================================================
 
 import os
+import sys
 import json
+import time
+import queue
+import bisect
+import atexit
+import threading
 from datetime import datetime
 from statistics import mean
 from collections import Counter
 
+# rule_engine.py في جذر المشروع → متاح أيضاً عند تشغيل هذا الملف مباشرة
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.append(_PROJECT_ROOT)
+
+from rule_engine import get_rule_engine
+from file_lock import FileLock, atomic_write_json, read_json
+from model_paths import BASE_MODELS_DIR
+
 # ============================================================
-# 🔹 المسار النهائي على جهازك (Windows)
+# 🔹 مجلد التوأم الرقمي (CHILDEYE_TWIN_DIR، افتراضياً داخل مجلد الموديلات)
 # ============================================================
+#
+# Workers of serve_production coordinate through the lock + state files
+# here, so all of them must see the same directory.
 
-BASE_PATH = r"C:\Users\dhayq\Desktop\GP-Code\ChildEyeServer\ChildEye_Models\DigitalTwin"
+BASE_PATH = os.getenv("CHILDEYE_TWIN_DIR") or os.path.join(BASE_MODELS_DIR, "DigitalTwin")
 os.makedirs(BASE_PATH, exist_ok=True)
 
 STATE_FILE = os.path.join(BASE_PATH, "digital_twin_state.json")
 HISTORY_FILE = os.path.join(BASE_PATH, "digital_twin_history.json")
 REPORT_FILE = os.path.join(BASE_PATH, "digital_twin_report.json")
 
+# حالة وتاريخ كل طفل في ملفات مستقلة (التنبؤ يعتمد على تاريخ نفس الطفل فقط)
+CHILDREN_DIR = os.path.join(BASE_PATH, "children")
+
+# ⚡ ميزانية زمن المرحلة المتزامنة + عدد عمال المرحلة المؤجلة
+FAST_PATH_BUDGET_MS = float(os.getenv("CHILDEYE_TWIN_BUDGET_MS", "20"))
+DEFERRED_WORKERS = int(os.getenv("CHILDEYE_TWIN_WORKERS", "2"))
+
+def _child_key(child_id):
+    return "".join(c for c in str(child_id) if c.isalnum() or c in "-_") or "unknown"
+
+
+def state_file(child_id=None):
+    if child_id is None:
+        return STATE_FILE
+    return os.path.join(CHILDREN_DIR, f"{_child_key(child_id)}_state.json")
+
+
+def history_file(child_id=None):
+    if child_id is None:
+        return HISTORY_FILE
+    return os.path.join(CHILDREN_DIR, f"{_child_key(child_id)}_history.json")
+
+
+def twin_lock(child_id=None):
+    """Cross-process lock of one child's state + history (workers of serve_production)."""
+    path = state_file(child_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return FileLock(path + ".lock")
+
 
 # ============================================================
 # 🔹 التحليل الذكي لحالة الطفل
@@ -27,67 +74,20 @@ REPORT_FILE = os.path.join(BASE_PATH, "digital_twin_report.json")
 def analyze_child_state(face_emotion=None, cry_emotion=None,
                         hr=None, rr=None, temp=None, sleep_state=None):
 
-    status = "normal"
-    reason = "stable and healthy"
-    confidence = 0.90
-
-    # 🌡️ تحليل الحرارة
-    if temp is not None:
-        if temp >= 39:
-            status, reason = "alert", "High fever (>39°C)"
-        elif temp >= 38:
-            status, reason = "warning", "Mild fever"
-        elif temp < 36:
-            status, reason = "warning", "Low body temperature"
-
-    # ❤️‍🔥 تحليل HR/RR
-    if hr and rr:
-        if hr > 140 or rr > 45:
-            status, reason = "alert", "High HR/RR → stress or pain"
-        elif hr < 90 or rr < 20:
-            status, reason = "warning", "Low HR/RR → deep sleep"
-
-    # 🙂 تحليل الوجه
-    if face_emotion:
-        if face_emotion == "cry":
-            status, reason = "alert", "Face shows crying/distress"
-        elif face_emotion == "sleep":
-            status, reason = "sleeping", "Eyes closed, calm expression"
-
-    # 🔊 تحليل البكاء
-    if cry_emotion:
-        if cry_emotion in ["pain", "discomfort"]:
-            status, reason = "alert", "Cry indicates pain"
-        elif cry_emotion == "hungry":
-            status, reason = "warning", "Cry indicates hunger"
-        elif cry_emotion == "laugh":
-            reason = "Baby laughing → positive mood"
-
-    # دمج المؤشرات
-    match_count = 0
-    if face_emotion == "cry" and cry_emotion in ["pain"]:
-        match_count += 1
-    if temp and temp > 38 and "fever" in reason:
-        match_count += 1
-
-    confidence = min(0.8 + (match_count * 0.05), 0.99)
-
-    return {
-        "status": status,
-        "reason": reason,
-        "confidence": round(confidence, 2)
-    }
+    # القواعد مُجمّعة في rule_engine (تُحدَّث تلقائياً عند تعديل ملفات القواعد)
+    return get_rule_engine().analyze(face_emotion, cry_emotion, hr, rr, temp, sleep_state)
 
 
 # ============================================================
 # 🔹 أدوات قراءة/تحليل التاريخ
 # ============================================================
 
-def load_history(limit=50):
-    if not os.path.exists(HISTORY_FILE):
+def load_history(limit=50, child_id=None):
+    path = history_file(child_id)
+    if not os.path.exists(path):
         return []
     try:
-        with open(HISTORY_FILE, "r") as f:
+        with open(path, "r") as f:
             data = json.load(f)
             return data[-limit:] if isinstance(data, list) else []
     except:
@@ -121,7 +121,7 @@ def ratio(arr):
 # ============================================================
 
 def predict_next_state_from_history(current_state):
-    history = load_history(limit=50)
+    history = load_history(limit=50, child_id=current_state.get("child_id"))
 
     if len(history) < 5:
         if current_state["status"] == "alert": return "monitor_closely"
@@ -160,35 +160,60 @@ def predict_next_state_from_history(current_state):
 # 💾 حفظ حالة التوأم الرقمي + التاريخ
 # ============================================================
 
-def update_twin_json(final_state):
-
-    # حفظ حالة التوأم الحالية
-    with open(STATE_FILE, "w") as f:
-        json.dump(final_state, f, indent=4)
-
-    # تحديث التاريخ
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, "r") as f:
-                history = json.load(f)
-        except:
-            history = []
-    else:
-        history = []
-
-    history.append({
+def _read_or_quarantine(path, default):
+    # الكتابة ذرّية، فالملف التالف ليس "نصف كتابة" → نحتفظ به جانباً بدل مسح التاريخ
+    try:
+        return read_json(path, default)
+    except ValueError as e:
+        aside = f"{path}.corrupt-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        os.replace(path, aside)
+        print(f"⚠️ Unreadable twin file moved to {aside}: {e}")
+        return default
+
+
+def _write_state_file(final_state):
+    """Caller holds twin_lock(child_id)."""
+    s_file = state_file(final_state.get("child_id"))
+    # حفظ حالة التوأم الحالية — فقط إذا كانت أحدث (عامل آخر قد يكون حفظ قراءة أحدث)
+    current = _read_or_quarantine(s_file, None)
+    if not current or current.get("timestamp", "") <= final_state["timestamp"]:
+        atomic_write_json(s_file, final_state, indent=4)
+
+
+def _write_twin_files(final_state):
+    """Caller holds twin_lock(child_id)."""
+    child_id = final_state.get("child_id")
+    h_file = history_file(child_id)
+    _write_state_file(final_state)
+
+    # تحديث التاريخ (مرتب حسب الوقت مهما كان ترتيب وصول العمال)
+    history = _read_or_quarantine(h_file, [])
+    entry = {
         "timestamp": final_state["timestamp"],
+        "child_id": child_id,
         "status": final_state["status"],
         "reason": final_state["reason"],
         "indicators": final_state["indicators"]
-    })
-
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(history[-200:], f, indent=4)
+    }
+    stamps = [h.get("timestamp", "") for h in history]
+    history.insert(bisect.bisect_right(stamps, entry["timestamp"]), entry)
+    atomic_write_json(h_file, history[-200:], indent=4)
 
     print("📝 Digital Twin JSON updated.")
 
 
+def update_twin_json(final_state):
+    with twin_lock(final_state.get("child_id")):
+        _write_twin_files(final_state)
+
+
+def save_twin_state(final_state):
+    """Current state only, no history entry (e.g. fleet tick results such as
+    "stale"), so /twin on every worker process returns it."""
+    with twin_lock(final_state.get("child_id")):
+        _write_state_file(final_state)
+
+
 # ============================================================
 # 🔧 الدالة الرئيسية للتوأم الرقمي
 # ============================================================
@@ -228,6 +253,171 @@ def update_twin_from_models(MODELS, latest_data=None):
     return final_state
 
 
+# ============================================================
+# ⚡ تحديث التوأم على مرحلتين (Alert fast-path)
+# ============================================================
+#
+# Phase 1 (caller thread): rules only — status / reason / confidence.
+# Phase 2 (background): the caller's deferred I/O (e.g. DB history rows),
+# prediction from the child's own history, JSON persistence and
+# publishing of the full state. Phase 2 runs on a worker chosen by
+# child_id, so updates of one child are applied in order inside a process.
+# Across serve_production workers, twin_lock() serializes the writes and
+# the files are ordered by reading timestamp, so the state file always
+# holds the newest reading whichever worker handled it.
+
+_LATEST_STATES = {}
+_SUBSCRIBERS = []
+
+
+def subscribe(callback):
+    """callback(child_id, full_state) after each completed twin update."""
+    _SUBSCRIBERS.append(callback)
+
+
+def get_latest_state(child_id):
+    """Newest state of the child written by any worker process, or published here."""
+    local = _LATEST_STATES.get(_child_key(child_id))
+    try:
+        shared = read_json(state_file(child_id))
+    except ValueError:
+        shared = None
+    if shared is None:
+        return local
+    if local is None or shared.get("timestamp", "") >= local.get("timestamp", ""):
+        return shared
+    return local
+
+
+def publish_state(child_id, state):
+    _LATEST_STATES[_child_key(child_id)] = state
+    for callback in list(_SUBSCRIBERS):
+        try:
+            callback(child_id, state)
+        except Exception as e:
+            print("twin subscriber error:", e)
+
+
+class _DeferredTwinQueue:
+
+    def __init__(self, workers=DEFERRED_WORKERS):
+        self.n = max(1, workers)
+        self._queues = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Worker threads are not inherited by fork(); restart them per process.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queues = [queue.Queue() for _ in range(self.n)]
+            for i, q in enumerate(self._queues):
+                threading.Thread(target=self._run, args=(q,),
+                                 name=f"twin-deferred-{i}", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self, q):
+        while True:
+            state, deferred_io = q.get()
+            try:
+                if deferred_io is not None:
+                    try:
+                        deferred_io()
+                    except Exception as e:
+                        print("twin deferred I/O error:", e)
+                _complete_twin_update(state)
+            except Exception as e:
+                print("twin deferred update error:", e)
+            finally:
+                q.task_done()
+
+    def submit(self, child_id, state, deferred_io=None):
+        self._ensure_started()
+        # Same key as the child's files: "7" and 7 share one queue, so one order.
+        self._queues[hash(_child_key(child_id)) % self.n].put((state, deferred_io))
+
+    def pending(self):
+        return sum(q.unfinished_tasks for q in self._queues)
+
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._pid == os.getpid() and self.pending():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+_DEFERRED = _DeferredTwinQueue()
+atexit.register(lambda: _DEFERRED.flush(timeout=5))
+
+
+def _complete_twin_update(state):
+    with twin_lock(state.get("child_id")):
+        prediction = predict_next_state_from_history(state)
+        final_state = {**state, "prediction": prediction}
+        _write_twin_files(final_state)
+    publish_state(state.get("child_id"), final_state)
+
+
+def analyze_twin_fast(latest_data=None, child_id=None, started_at=None):
+    """Phase 1 without queuing phase 2; `started_at` (time.monotonic()) lets
+    the budget cover the whole request. Pass the result to submit_twin_update()."""
+    started_at = started_at if started_at is not None else time.monotonic()
+
+    indicators = {
+        "hr": latest_data.get("hr"),
+        "rr": latest_data.get("rr"),
+        "temp": latest_data.get("temp"),
+        "face_emotion": latest_data.get("face_emotion"),
+        "cry_emotion": latest_data.get("cry_emotion"),
+        "sleep_state": latest_data.get("sleep_state"),
+    }
+    analysis = analyze_child_state(
+        indicators["face_emotion"], indicators["cry_emotion"],
+        indicators["hr"], indicators["rr"], indicators["temp"],
+        indicators["sleep_state"],
+    )
+
+    state = {
+        "timestamp": datetime.now().isoformat(),
+        "child_id": child_id,
+        "status": analysis["status"],
+        "reason": analysis["reason"],
+        "confidence": analysis["confidence"],
+        "prediction": "pending",
+        "indicators": indicators,
+    }
+
+    elapsed_ms = (time.monotonic() - started_at) * 1000
+    if elapsed_ms > FAST_PATH_BUDGET_MS:
+        print(f"⚠️ Twin fast-path took {elapsed_ms:.1f} ms (budget {FAST_PATH_BUDGET_MS:.0f} ms)")
+
+    return {**state, "latency_ms": round(elapsed_ms, 2)}
+
+
+def submit_twin_update(state, deferred_io=None):
+    """Queue phase 2 of an analyze_twin_fast() state; `deferred_io` runs
+    before the state is saved, in the child's order."""
+    state = {k: v for k, v in state.items() if k != "latency_ms"}
+    _DEFERRED.submit(state.get("child_id"), state, deferred_io)
+
+
+def update_twin_fast(MODELS, latest_data=None, child_id=None, started_at=None, deferred_io=None):
+    """Phase 1 + queue phase 2 (see analyze_twin_fast / submit_twin_update)."""
+    state = analyze_twin_fast(latest_data, child_id, started_at)
+    submit_twin_update(state, deferred_io)
+    return state
+
+
+def flush_deferred_updates(timeout=None):
+    """Block until every queued phase-2 update has been persisted."""
+    return _DEFERRED.flush(timeout)
+
+
 # ============================================================
 # 📊 تقرير كامل للتوأم الرقمي
 # ============================================================
@@ -268,6 +458,9 @@ def reset_twin_history():
     for file in [STATE_FILE, HISTORY_FILE, REPORT_FILE]:
         if os.path.exists(file):
             os.remove(file)
+    if os.path.isdir(CHILDREN_DIR):
+        for name in os.listdir(CHILDREN_DIR):
+            os.remove(os.path.join(CHILDREN_DIR, name))
     return {"status": "reset_done"}
 
 
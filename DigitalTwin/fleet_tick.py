@@ -0,0 +1,459 @@
+# ============================================================
+# 🛰️ Child-Eye Fleet Tick — Vectorized Twin for All Children
+# ============================================================
+#
+# Keeps the latest indicators and a short history window of every child
+# in columnar NumPy arrays (one row per child). A periodic tick then
+#   1) pulls the vitals rows that arrived since the last tick,
+#   2) runs the rule engine (analyze_child_state) for all children at once,
+#   3) runs the trend logic of predict_next_state_from_history vectorized,
+#   4) flags children whose device stopped reporting,
+# and only publishes / persists the children whose state changed.
+#
+# Only one process runs the ticker (worker 0 or the standalone command).
+# Changed states are saved to each child's twin state file (save_states)
+# so /twin answers the same on every worker, and after every tick the
+# stale list is written to STALE_FILE for /fleet/stale.
+#
+#   python -m DigitalTwin.fleet_tick            # run the ticker from the DB
+#   python -m DigitalTwin.fleet_tick --bench 10000
+
+import os
+import time
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from rule_engine import get_rule_engine
+from file_lock import atomic_write_json, read_json
+from DigitalTwin.digital_twin_core import BASE_PATH, publish_state, save_twin_state
+
+# ============================================================
+# 🔹 الإعدادات
+# ============================================================
+
+TICK_SECONDS = float(os.getenv("CHILDEYE_FLEET_TICK_SECONDS", "0"))
+STALE_SECONDS = float(os.getenv("CHILDEYE_STALE_SECONDS", "120"))
+STALE_FILE = os.path.join(BASE_PATH, "fleet_stale.json")
+
+WINDOW = 10   # history[-10:] for the status ratios
+TAIL = 8      # trend_last(..., tail=8)
+MIN_HISTORY = 5
+
+NUMERIC = ("hr", "rr", "temp")
+CATEGORICAL = ("face_emotion", "cry_emotion", "sleep_state")
+STATUS_CODES = {"normal": 0, "warning": 1, "alert": 2, "sleeping": 3}
+
+DB_COLUMNS = {
+    "hr": "heart_rate",
+    "rr": "resp_rate",
+    "temp": "temperature",
+    "cry_emotion": "cry_classification",
+    "face_emotion": "emotion_status",
+}
+
+
+# ============================================================
+# 📈 الاتجاهات (نسخة vectorized من trend_last / ratio)
+# ============================================================
+
+def _push(ring, counts, rows, values):
+    # Right-aligned ring buffers: newest value in the last column.
+    ring[rows, :-1] = ring[rows, 1:]
+    ring[rows, -1] = values
+    counts[rows] = np.minimum(counts[rows] + 1, ring.shape[1])
+
+
+def trend_last_v(ring, counts, tail=TAIL):
+    """trend_last() for every row: mean(second half) - mean(first half)."""
+    k = ring.shape[1]
+    n = np.minimum(counts, max(2, tail))
+    mid = n // 2
+    j = np.arange(k)[None, :]
+    start = (k - n)[:, None]
+    split = (k - n + mid)[:, None]
+    first = (j >= start) & (j < split)
+    second = j >= split
+
+    vals = np.where(np.isnan(ring), 0.0, ring)
+    n1 = first.sum(1)
+    n2 = second.sum(1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        m1 = (vals * first).sum(1) / n1
+        m2 = (vals * second).sum(1) / n2
+    ok = (counts >= 2) & (n1 > 0) & (n2 > 0)
+    return np.where(ok, m2 - m1, 0.0)
+
+
+def status_ratio_v(ring, counts, code):
+    k = ring.shape[1]
+    valid = np.arange(k)[None, :] >= (k - counts)[:, None]
+    hits = ((ring == code) & valid).sum(1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, hits / counts, 0.0)
+
+
+def predict_next_state_v(status, status_ring, status_counts, tr_hr, tr_rr, tr_tmp):
+    """predict_next_state_from_history() for every child in one pass."""
+    alerts = status_ratio_v(status_ring, status_counts, STATUS_CODES["alert"])
+    warnings = status_ratio_v(status_ring, status_counts, STATUS_CODES["warning"])
+    sleeping = status_ratio_v(status_ring, status_counts, STATUS_CODES["sleeping"])
+
+    short = status_counts < MIN_HISTORY
+    return np.select(
+        [
+            short & (status == "alert"),
+            short & (status == "sleeping"),
+            short,
+            (alerts >= 0.3) & ((tr_hr > 0.3) | (tr_rr > 0.3) | (tr_tmp > 0.3)),
+            (alerts < 0.2) & (tr_hr < -0.3) & (tr_rr < -0.3),
+            (sleeping > 0.4) & (tr_hr <= 0) & (tr_rr <= 0),
+            (alerts + warnings) >= 0.4,
+        ],
+        ["monitor_closely", "likely_resting", "stable",
+         "risk_of_alert", "likely_recovering", "likely_resting", "monitor_closely"],
+        default="stable",
+    ).astype(object)
+
+
+# ============================================================
+# 🛰️ حالة الأسطول
+# ============================================================
+
+class FleetTwin:
+
+    def __init__(self, capacity=1024, stale_after=STALE_SECONDS, engine=None,
+                 on_change=None):
+        self.stale_after = stale_after
+        self.engine = engine
+        self.on_change = on_change
+        self.child_ids = []
+        self.index = {}
+        self.size = 0
+        self._lock = threading.Lock()
+        self._watermark = None
+        self._seen_at_watermark = set()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.latest = {k: np.full(capacity, np.nan) for k in NUMERIC}
+        self.latest.update({k: np.full(capacity, None, dtype=object) for k in CATEGORICAL})
+        self.rings = {k: np.full((capacity, TAIL), np.nan) for k in NUMERIC}
+        self.ring_counts = {k: np.zeros(capacity, dtype=np.int64) for k in NUMERIC}
+        self.status_ring = np.full((capacity, WINDOW), -1, dtype=np.int8)
+        self.status_counts = np.zeros(capacity, dtype=np.int64)
+        self.last_seen = np.full(capacity, np.nan)
+        self.published = {
+            k: np.full(capacity, None, dtype=object)
+            for k in ("status", "reason", "prediction", "stale")
+        }
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        old = (self.latest, self.rings, self.ring_counts, self.status_ring,
+               self.status_counts, self.last_seen, self.published)
+        n = min(self.size, self.capacity)
+        self._allocate(capacity)
+        for new_d, old_d in ((self.latest, old[0]), (self.rings, old[1]),
+                             (self.ring_counts, old[2]), (self.published, old[6])):
+            for k in new_d:
+                new_d[k][:n] = old_d[k][:n]
+        self.status_ring[:n] = old[3][:n]
+        self.status_counts[:n] = old[4][:n]
+        self.last_seen[:n] = old[5][:n]
+
+    def _rows_for(self, child_ids):
+        rows = np.empty(len(child_ids), dtype=np.int64)
+        for i, cid in enumerate(child_ids):
+            row = self.index.get(cid)
+            if row is None:
+                row = self.size
+                self.index[cid] = row
+                self.child_ids.append(cid)
+                self.size += 1
+            rows[i] = row
+        self._grow(self.size)
+        return rows
+
+    # ---------- ingest ----------
+
+    def observe_batch(self, child_ids, columns, timestamps):
+        """Add readings (oldest first). columns: {"hr", "rr", "temp", "face_emotion", ...}."""
+        if not len(child_ids):
+            return
+        engine = self.engine or get_rule_engine()
+        with self._lock:
+            rows = self._rows_for(child_ids)
+            n = len(rows)
+            cols = {k: _as_float(columns.get(k, [None] * n)) for k in NUMERIC}
+            cols.update({k: np.asarray(columns.get(k, [None] * n), dtype=object) for k in CATEGORICAL})
+            status = engine.evaluate_columns(cols, n)["status"]
+            codes = np.array([STATUS_CODES.get(s, 4) for s in status], dtype=np.int8)
+            ts = np.asarray(timestamps, dtype=np.float64)
+
+            # One reading per child per round keeps every ring in order.
+            pending = np.arange(n)
+            while len(pending):
+                _, first = np.unique(rows[pending], return_index=True)
+                take = pending[first]
+                r = rows[take]
+                for k in NUMERIC:
+                    v = cols[k][take]
+                    ok = ~np.isnan(v)
+                    _push(self.rings[k], self.ring_counts[k], r[ok], v[ok])
+                    self.latest[k][r] = v
+                for k in CATEGORICAL:
+                    self.latest[k][r] = cols[k][take]
+                _push(self.status_ring, self.status_counts, r, codes[take])
+                self.last_seen[r] = np.fmax(self.last_seen[r], ts[take])
+                pending = np.delete(pending, first)
+
+    def observe(self, child_id, indicators, timestamp=None):
+        self.observe_batch(
+            [child_id],
+            {k: [indicators.get(k)] for k in NUMERIC + CATEGORICAL},
+            [timestamp if timestamp is not None else time.time()],
+        )
+
+    def refresh_from_db(self, conn, bootstrap_rows=WINDOW):
+        """Pull vitals rows newer than the last tick (last N per child on first call)."""
+        cur = conn.cursor(dictionary=True)
+        cols = ", ".join(["child_id", "timestamp"] + list(DB_COLUMNS.values()))
+        if self._watermark is None:
+            cur.execute(f"""
+                SELECT {cols} FROM (
+                    SELECT {cols}, ROW_NUMBER() OVER (
+                        PARTITION BY child_id ORDER BY timestamp DESC) AS rn
+                    FROM vitals
+                ) t WHERE rn <= %s ORDER BY timestamp
+            """, (bootstrap_rows,))
+        else:
+            cur.execute(f"""
+                SELECT {cols} FROM vitals WHERE timestamp >= %s ORDER BY timestamp
+            """, (self._watermark,))
+        rows = cur.fetchall()
+        cur.close()
+
+        # Rows sharing the watermark second were already ingested last time.
+        fresh = [r for r in rows if (r["child_id"], r["timestamp"]) not in self._seen_at_watermark]
+        if rows:
+            self._watermark = rows[-1]["timestamp"]
+            self._seen_at_watermark = {
+                (r["child_id"], r["timestamp"]) for r in rows if r["timestamp"] == self._watermark}
+        elif self._watermark is None:
+            self._watermark = datetime.now()
+
+        if fresh:
+            columns = {k: [r.get(c) for r in fresh] for k, c in DB_COLUMNS.items()}
+            self.observe_batch([r["child_id"] for r in fresh], columns,
+                               [r["timestamp"].timestamp() for r in fresh])
+        return len(fresh)
+
+    # ---------- tick ----------
+
+    def tick(self, now=None):
+        now = now if now is not None else time.time()
+        engine = self.engine or get_rule_engine()
+        with self._lock:
+            n = self.size
+            if n == 0:
+                return []
+            cols = {k: self.latest[k][:n] for k in NUMERIC + CATEGORICAL}
+            out = engine.evaluate_columns(cols, n)
+            status, reason = out["status"], out["reason"]
+
+            trends = [trend_last_v(self.rings[k][:n], self.ring_counts[k][:n]) for k in NUMERIC]
+            prediction = predict_next_state_v(
+                status, self.status_ring[:n], self.status_counts[:n], *trends)
+
+            age = now - self.last_seen[:n]
+            stale = age > self.stale_after
+            if stale.any():
+                status = status.copy()
+                reason = reason.copy()
+                status[stale] = "stale"
+                # Fixed text so a stale child is published once, not every tick.
+                reason[stale] = f"No readings from device for >{int(self.stale_after)}s"
+
+            pub = self.published
+            changed = np.nonzero(
+                (pub["status"][:n] != status) | (pub["reason"][:n] != reason)
+                | (pub["prediction"][:n] != prediction) | (pub["stale"][:n] != stale)
+            )[0]
+            pub["status"][changed] = status[changed]
+            pub["reason"][changed] = reason[changed]
+            pub["prediction"][changed] = prediction[changed]
+            pub["stale"][changed] = stale[changed]
+
+            stamp = datetime.fromtimestamp(now).isoformat()
+            states = [{
+                "timestamp": stamp,
+                "child_id": self.child_ids[i],
+                "status": status[i],
+                "reason": reason[i],
+                "confidence": float(out["confidence"][i]),
+                "prediction": prediction[i],
+                "device_stale": bool(stale[i]),
+                "last_seen": datetime.fromtimestamp(self.last_seen[i]).isoformat(),
+                "indicators": {k: _plain(self.latest[k][i]) for k in NUMERIC + CATEGORICAL},
+                "source": "fleet_tick",
+            } for i in changed]
+
+        for state in states:
+            publish_state(state["child_id"], state)
+        if states and self.on_change:
+            self.on_change(states)
+        return states
+
+
+    def stale_children(self):
+        with self._lock:
+            n = self.size
+            return [self.child_ids[i] for i in range(n) if self.published["stale"][i]]
+
+
+def _as_float(values):
+    arr = np.asarray(values)
+    if arr.dtype.kind == "f":
+        return arr.astype(np.float64, copy=False)
+    return np.array([np.nan if v is None else float(v) for v in arr], dtype=np.float64)
+
+
+def _plain(v):
+    if isinstance(v, float) and np.isnan(v):
+        return None
+    return v.item() if isinstance(v, np.generic) else v
+
+
+def save_states(states):
+    for state in states:
+        save_twin_state(state)
+
+
+def write_stale_snapshot(fleet, path=STALE_FILE):
+    atomic_write_json(path, {
+        "updated_at": time.time(),
+        "children": fleet.size,
+        "stale": [_plain(cid) for cid in fleet.stale_children()],
+    })
+
+
+def read_stale_snapshot(path=STALE_FILE):
+    """Last tick's stale list, or None if no ticker has written one yet."""
+    return read_json(path)
+
+
+# ============================================================
+# ⏱️ التشغيل الدوري
+# ============================================================
+
+class FleetTicker:
+
+    def __init__(self, fleet, interval=TICK_SECONDS, connect=None, snapshot_path=STALE_FILE):
+        self.fleet = fleet
+        self.interval = interval
+        self.connect = connect
+        self.snapshot_path = snapshot_path
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        t0 = time.perf_counter()
+        pulled = 0
+        if self.connect is not None:
+            conn = self.connect()
+            if conn is not None:
+                try:
+                    pulled = self.fleet.refresh_from_db(conn)
+                finally:
+                    conn.close()
+        changed = self.fleet.tick()
+        if self.snapshot_path:
+            write_stale_snapshot(self.fleet, self.snapshot_path)
+        elapsed = (time.perf_counter() - t0) * 1000
+        if changed:
+            print(f"🛰️ Fleet tick: {self.fleet.size} children, {pulled} new rows, "
+                  f"{len(changed)} changed ({elapsed:.0f} ms)")
+        return changed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print("fleet tick error:", e)
+
+    def start(self):
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="fleet-tick", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+# ============================================================
+# 🔧 اختبار سرعة / تشغيل مستقل
+# ============================================================
+
+def bench(children, rounds=5):
+    rng = np.random.default_rng(0)
+    fleet = FleetTwin(capacity=children)
+    now = time.time()
+    ids = list(range(children))
+    for step in range(WINDOW):
+        fleet.observe_batch(ids, {
+            "hr": rng.normal(120, 15, children),
+            "rr": rng.normal(32, 6, children),
+            "temp": rng.normal(37, 0.7, children),
+            "cry_emotion": rng.choice(["silence", "pain", "hungry", "laugh"], children).astype(object),
+            "face_emotion": rng.choice(["neutral", "cry", "sleep", "happy"], children).astype(object),
+        }, np.full(children, now - 60 * (WINDOW - step)) + rng.uniform(0, 600, children))
+
+    for r in range(rounds):
+        t0 = time.perf_counter()
+        changed = fleet.tick(now=now + r)
+        print(f"tick {r}: {children} children, {len(changed)} changed, "
+              f"{(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Child-Eye fleet tick")
+    parser.add_argument("--bench", type=int, help="time a tick over N synthetic children")
+    parser.add_argument("--interval", type=float, default=TICK_SECONDS or 30.0)
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        bench(args.bench)
+        return
+
+    from db_connection import get_connection
+    from model_paths import MODEL_PATHS
+    from rule_engine import RuleEngine, set_rule_engine
+
+    # Same rule metadata as the server, so both publish the same status.
+    engine = RuleEngine.from_paths(MODEL_PATHS)
+    set_rule_engine(engine)
+    engine.start_watcher()
+
+    ticker = FleetTicker(FleetTwin(on_change=save_states), args.interval, get_connection)
+    print(f"🛰️ Fleet ticker every {args.interval:.0f}s (stale after {STALE_SECONDS:.0f}s)")
+    while True:
+        try:
+            ticker.run_once()
+        except Exception as e:
+            print("fleet tick error:", e)
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
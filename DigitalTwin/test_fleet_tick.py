@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+import pytest
+
+from DigitalTwin import digital_twin_core as core
+from DigitalTwin.fleet_tick import FleetTicker, FleetTwin, read_stale_snapshot, save_states
+from rule_engine import RuleEngine
+
+
+@pytest.fixture(autouse=True)
+def twin_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "CHILDREN_DIR", str(tmp_path / "children"))
+    monkeypatch.setattr(core, "STATE_FILE", str(tmp_path / "digital_twin_state.json"))
+    monkeypatch.setattr(core, "HISTORY_FILE", str(tmp_path / "digital_twin_history.json"))
+    yield tmp_path
+
+
+def _reading(rng):
+    def maybe(value):
+        return None if rng.random() < 0.1 else round(float(value), 2)
+    return {
+        "hr": maybe(rng.normal(125, 25)),
+        "rr": maybe(rng.normal(35, 10)),
+        "temp": maybe(rng.normal(37.5, 1.0)),
+        "face_emotion": rng.choice(["neutral", "cry", "sleep", "happy", None]),
+        "cry_emotion": rng.choice(["silence", "pain", "hungry", "laugh", None]),
+        "sleep_state": None,
+    }
+
+
+def test_vectorized_prediction_matches_predict_next_state_from_history():
+    rng = np.random.default_rng(7)
+    engine = RuleEngine()
+    fleet = FleetTwin(capacity=4, stale_after=1e9, engine=engine)
+    expected = {}
+
+    for child_id in range(60):
+        # Lengths around MIN_HISTORY and past the 8/10-reading windows.
+        for i in range(int(rng.integers(1, 16))):
+            ind = _reading(rng)
+            analysis = engine.analyze(ind["face_emotion"], ind["cry_emotion"],
+                                      ind["hr"], ind["rr"], ind["temp"], ind["sleep_state"])
+            state = {"timestamp": f"2026-01-01T00:{i:02d}:00", "child_id": child_id,
+                     "status": analysis["status"], "reason": analysis["reason"],
+                     "indicators": ind}
+            core.update_twin_json(state)
+            fleet.observe(child_id, ind, timestamp=1000.0 + i)
+        # The tick re-evaluates once the latest reading is part of the history.
+        expected[child_id] = core.predict_next_state_from_history(state)
+
+    got = {s["child_id"]: s["prediction"] for s in fleet.tick(now=2000.0)}
+    assert got == expected
+    assert len(set(expected.values())) >= 3
+
+
+def test_every_worker_reads_the_stale_list_of_the_ticking_process(tmp_path):
+    path = str(tmp_path / "fleet_stale.json")
+    assert read_stale_snapshot(path) is None
+
+    fleet = FleetTwin(stale_after=60, engine=RuleEngine())
+    fleet.observe(1, {"hr": 120, "rr": 30, "temp": 36.8}, timestamp=0.0)
+    fleet.observe(2, {"hr": 120, "rr": 30, "temp": 36.8}, timestamp=time.time())
+    FleetTicker(fleet, snapshot_path=path).run_once()
+
+    snapshot = read_stale_snapshot(path)
+    assert snapshot["children"] == 2
+    assert snapshot["stale"] == [1]
+
+
+def test_stale_state_is_what_every_worker_reads_until_a_new_reading(monkeypatch):
+    core.update_twin_json({"timestamp": "2026-01-01T00:00:00", "child_id": 5, "status": "normal",
+                           "reason": "stable and healthy", "indicators": {"hr": 120}})
+    fleet = FleetTwin(stale_after=60, engine=RuleEngine(), on_change=save_states)
+    fleet.observe(5, {"hr": 120, "rr": 30, "temp": 36.8}, timestamp=0.0)
+    fleet.tick()
+
+    # Another worker: nothing published in its memory, only the shared files.
+    monkeypatch.setattr(core, "_LATEST_STATES", {})
+    assert core.get_latest_state(5)["status"] == "stale"
+    assert len(core.load_history(child_id=5)) == 1      # no history entry for the tick
+
+    core.update_twin_json({"timestamp": "2999-01-01T00:00:00", "child_id": 5, "status": "normal",
+                           "reason": "stable and healthy", "indicators": {"hr": 120}})
+    assert core.get_latest_state(5)["status"] == "normal"
@@ -0,0 +1,119 @@
+import os
+import time
+import multiprocessing
+
+import pytest
+
+import digital_twin_core as core
+
+
+@pytest.fixture(autouse=True)
+def twin_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "CHILDREN_DIR", str(tmp_path / "children"))
+    monkeypatch.setattr(core, "STATE_FILE", str(tmp_path / "digital_twin_state.json"))
+    monkeypatch.setattr(core, "HISTORY_FILE", str(tmp_path / "digital_twin_history.json"))
+    yield tmp_path
+    core.flush_deferred_updates(timeout=5)
+
+
+FEVER = {"hr": 150, "rr": 50, "temp": 39.5, "face_emotion": "cry", "cry_emotion": "pain"}
+CALM = {"hr": 120, "rr": 30, "temp": 36.8, "face_emotion": "neutral", "cry_emotion": "silence"}
+
+
+def test_fast_path_returns_alert_and_defers_prediction():
+    state = core.update_twin_fast({}, FEVER, child_id=7)
+    assert state["status"] == "alert"
+    assert state["prediction"] == "pending"
+
+    assert core.flush_deferred_updates(timeout=5)
+    latest = core.get_latest_state(7)
+    assert latest["status"] == "alert"
+    assert latest["prediction"] != "pending"
+    assert core.load_history(child_id=7)[-1]["child_id"] == 7
+
+
+def test_budget_is_measured_from_request_start():
+    state = core.update_twin_fast({}, CALM, child_id=1, started_at=time.monotonic() - 0.05)
+    assert state["latency_ms"] >= 50
+
+
+def test_deferred_io_runs_in_order_before_the_state_is_saved():
+    calls = []
+    for i in range(20):
+        core.update_twin_fast({}, CALM, child_id=3,
+                              deferred_io=lambda i=i: calls.append((i, len(core.load_history(child_id=3)))))
+    assert core.flush_deferred_updates(timeout=5)
+    assert calls == [(i, i) for i in range(20)]
+
+
+def test_prediction_uses_only_the_childs_own_history():
+    for i in range(12):
+        hot = dict(FEVER, hr=150 + i, rr=50 + i, temp=39.0 + i / 10)
+        core.update_twin_fast({}, hot, child_id=1)
+        core.update_twin_fast({}, CALM, child_id=2)
+    assert core.flush_deferred_updates(timeout=5)
+
+    assert core.get_latest_state(1)["prediction"] == "risk_of_alert"
+    assert core.get_latest_state(2)["prediction"] == "stable"
+    assert {h["child_id"] for h in core.load_history(child_id=2)} == {2}
+
+
+def _write_states(child_id, stamps):
+    for ts in stamps:
+        core.update_twin_json({"timestamp": ts, "child_id": child_id, "status": "normal",
+                               "reason": "stable and healthy", "confidence": 0.8,
+                               "prediction": "stable", "indicators": dict(CALM)})
+
+
+def test_worker_processes_keep_history_ordered_and_state_newest():
+    ctx = multiprocessing.get_context("fork")
+    stamps = [f"2026-01-01T00:00:{i:02d}.000001" for i in range(60)]
+    # Three "workers" write interleaved readings of the same child, newest first in one.
+    procs = [ctx.Process(target=_write_states, args=(9, stamps[0::3])),
+             ctx.Process(target=_write_states, args=(9, stamps[1::3])),
+             ctx.Process(target=_write_states, args=(9, stamps[2::3][::-1]))]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=60)
+        assert p.exitcode == 0
+
+    history = core.load_history(limit=200, child_id=9)
+    assert [h["timestamp"] for h in history] == stamps
+    assert core.get_latest_state(9)["timestamp"] == stamps[-1]
+
+
+def test_corrupt_history_is_kept_aside_not_wiped(twin_dir):
+    path = core.history_file(4)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write('[{"timestamp": "2026-01-01T00:00:00"')
+    _write_states(4, ["2026-01-01T00:00:01"])
+
+    assert len(core.load_history(child_id=4)) == 1
+    aside = [n for n in os.listdir(os.path.dirname(path)) if ".corrupt-" in n]
+    assert len(aside) == 1
+
+
+def test_string_and_int_ids_of_one_child_keep_one_order(monkeypatch):
+    monkeypatch.setattr(core, "_DEFERRED", core._DeferredTwinQueue(workers=8))
+    calls = []
+    for i in range(40):
+        core.update_twin_fast({}, CALM, child_id=str(8) if i % 2 else 8,
+                              deferred_io=lambda i=i: calls.append(i))
+    assert core.flush_deferred_updates(timeout=5)
+    assert calls == list(range(40))
+    assert len(core.load_history(limit=100, child_id="8")) == 40
+    assert core.get_latest_state("8") == core.get_latest_state(8)
+
+
+def test_analysis_alone_records_nothing_until_submitted():
+    state = core.analyze_twin_fast(FEVER, child_id=11)
+    assert state["status"] == "alert"
+    assert core.flush_deferred_updates(timeout=5)
+    assert core.load_history(child_id=11) == []     # e.g. the vitals INSERT failed
+
+    core.submit_twin_update(state)
+    assert core.flush_deferred_updates(timeout=5)
+    assert "latency_ms" not in core.load_history(child_id=11)[-1]
+    assert core.get_latest_state(11)["prediction"] != "pending"
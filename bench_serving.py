@@ -0,0 +1,246 @@
+# ============================================================
+# 📈 Child-Eye Serving Benchmark — Throughput vs Workers
+# ============================================================
+#
+# Starts serve_production.py with 1, 2, 4 … N workers, drives
+# POST /predict/cry (audio decode + mel-spectrogram + cry model predict)
+# with concurrent client processes and reports requests/s plus the memory
+# of every worker. RSS counts shared pages in every process; PSS divides
+# them between the sharers, so PSS per worker is the cost of adding one
+# more worker (each worker loads its own copy of the models).
+#
+#   python bench_serving.py                          # synthesized 3 s cry clip
+#   python bench_serving.py --audio sample_cry.wav   # a real recording
+#   python bench_serving.py --models-dir /srv/childeye/models
+#
+# Only responses that carry a cry_type count as successes, so a missing
+# model shows up as errors instead of fast "requests".
+#
+# Memory numbers need Linux (/proc/<pid>/smaps_rollup).
+
+import io
+import os
+import sys
+import math
+import time
+import json
+import wave
+import signal
+import argparse
+import subprocess
+import multiprocessing as mp
+
+import numpy as np
+import requests
+
+
+def parse_args(argv=None):
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Benchmark serve_production.py")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--workers", default=None,
+                        help="comma separated worker counts (default: 1,2,4..cores)")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=max(4, 2 * cpus))
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--audio", help="WAV file to POST (default: synthesized cry clip)")
+    parser.add_argument("--models-dir", help="CHILDEYE_MODELS_DIR for the server")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    args = parser.parse_args(argv)
+
+    if args.workers:
+        args.workers = [int(w) for w in args.workers.split(",")]
+    else:
+        counts, w = [], 1
+        while w < cpus:
+            counts.append(w)
+            w *= 2
+        args.workers = counts + [cpus]
+    return args
+
+
+# ============================================================
+# 🎼 مقطع بكاء مُصنَّع
+# ============================================================
+
+def synth_cry_wav(seconds=3.0, sr=16000, seed=0):
+    """Cry-like test clip: ~450 Hz fundamental with vibrato, harmonics, bursts and noise."""
+    t = np.arange(int(seconds * sr)) / sr
+    f0 = 450 + 80 * np.sin(2 * np.pi * 3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(np.sin(k * phase) / k for k in (1, 2, 3, 4))
+    y *= 0.5 + 0.5 * np.clip(np.sin(2 * np.pi * 0.8 * t), 0, None)
+    y += 0.02 * np.random.default_rng(seed).standard_normal(len(t))
+    y = 0.8 * y / np.max(np.abs(y))
+
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes((y * 32767).astype("<i2").tobytes())
+    return buf.getvalue()
+
+
+# ============================================================
+# 🧠 ذاكرة العمليات
+# ============================================================
+
+def child_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def memory_kb(pid):
+    out = {"rss_kb": None, "pss_kb": None}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    out["rss_kb"] = int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    out["pss_kb"] = int(line.split()[1])
+    except OSError:
+        pass
+    return out
+
+
+# ============================================================
+# 🔫 العملاء
+# ============================================================
+
+def client_loop(url, audio, stop_at, results):
+    session = requests.Session()
+    ok = err = 0
+    latencies = []
+    while time.time() < stop_at:
+        t0 = time.perf_counter()
+        try:
+            r = session.post(url, files={"file": ("clip.wav", audio)},
+                             data={"priority": "batch"}, timeout=60)
+            if r.status_code == 200 and "cry_type" in r.json():
+                ok += 1
+                latencies.append(time.perf_counter() - t0)
+            else:
+                err += 1
+        except (requests.RequestException, ValueError):
+            err += 1
+    results.put((ok, err, latencies))
+
+
+def drive(url, audio, clients, duration):
+    results = mp.Queue()
+    stop_at = time.time() + duration
+    procs = [mp.Process(target=client_loop, args=(url, audio, stop_at, results))
+             for _ in range(clients)]
+    for p in procs:
+        p.start()
+    ok = err = 0
+    latencies = []
+    for _ in procs:
+        o, e, lat = results.get()
+        ok, err = ok + o, err + e
+        latencies.extend(lat)
+    for p in procs:
+        p.join()
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] if latencies else 0.0
+    p95 = latencies[math.ceil(0.95 * len(latencies)) - 1] if latencies else 0.0
+    return ok, err, p50, p95
+
+
+# ============================================================
+# 🚀 تشغيل سيناريو واحد
+# ============================================================
+
+def run_one(workers, args, audio):
+    base = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ)
+    if args.models_dir:
+        env["CHILDEYE_MODELS_DIR"] = args.models_dir
+    server = subprocess.Popen(
+        [sys.executable, "serve_production.py", "--workers", str(workers),
+         "--threads", str(args.threads), "--port", str(args.port), "--host", "127.0.0.1"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + args.startup_timeout
+        while True:
+            try:
+                if requests.get(f"{base}/test", timeout=2).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if time.time() > deadline or server.poll() is not None:
+                raise RuntimeError(f"server with {workers} workers did not start")
+            time.sleep(0.5)
+
+        # Every worker loads its models after fork; the warm-up lets all of
+        # them finish loading and trace predict() before measuring.
+        url = f"{base}/predict/cry"
+        ok, _, _, _ = drive(url, audio, args.clients, args.warmup)
+        if not ok:
+            raise RuntimeError("warm-up got no cry predictions (is the cry model there?)")
+        ok, err, p50, p95 = drive(url, audio, args.clients, args.duration)
+
+        master_mem = memory_kb(server.pid)
+        worker_mem = [memory_kb(p) for p in child_pids(server.pid)]
+        return {
+            "workers": workers,
+            "req_per_s": round(ok / args.duration, 1),
+            "errors": err,
+            "p50_ms": round(p50 * 1000, 1),
+            "p95_ms": round(p95 * 1000, 1),
+            "master_rss_mb": _mb(master_mem["rss_kb"]),
+            "worker_rss_mb": _avg_mb(worker_mem, "rss_kb"),
+            "worker_pss_mb": _avg_mb(worker_mem, "pss_kb"),
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def _mb(kb):
+    return round(kb / 1024, 1) if kb is not None else None
+
+
+def _avg_mb(mems, key):
+    vals = [m[key] for m in mems if m[key] is not None]
+    return _mb(sum(vals) / len(vals)) if vals else None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.audio:
+        with open(args.audio, "rb") as f:
+            audio = f.read()
+    else:
+        audio = synth_cry_wav()
+
+    rows = []
+    for w in args.workers:
+        print(f"⏱️ {w} worker(s)...", file=sys.stderr, flush=True)
+        rows.append(run_one(w, args, audio))
+
+    base_rps = rows[0]["req_per_s"] or 1.0
+    print("\n{:>7} | {:>9} | {:>7} | {:>7} | {:>7} | {:>10} | {:>10} | {:>10}".format(
+        "workers", "req/s", "speedup", "p50 ms", "p95 ms", "master MB", "wkr RSS MB", "wkr PSS MB"))
+    print("-" * 92)
+    for r in rows:
+        print("{:>7} | {:>9} | {:>7} | {:>7} | {:>7} | {:>10} | {:>10} | {:>10}".format(
+            r["workers"], r["req_per_s"], f"{r['req_per_s'] / base_rps:.2f}x",
+            r["p50_ms"], r["p95_ms"], str(r["master_rss_mb"]),
+            str(r["worker_rss_mb"]), str(r["worker_pss_mb"])))
+    print(json.dumps(rows), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Keep the twin's default data directory out of the source tree under test.
+os.environ.setdefault("CHILDEYE_TWIN_DIR", tempfile.mkdtemp(prefix="childeye-twin-"))
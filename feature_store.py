@@ -0,0 +1,320 @@
+# ============================================================
+# 💽 Child-Eye Feature Store — Memory-Mapped Cry Features
+# ============================================================
+#
+# Keeps the 224x224 mel-spectrogram image of every cry clip in chunked
+# .npy files opened as memory maps, indexed by the clip's content hash
+# and child_id. A clip uploaded for several children is stored once and
+# recorded once per (hash, child_id). Re-scoring a new cry model reads the
+# chunks in place and feeds batched predict() calls without decoding any
+# audio again.
+#
+# Two layouts:
+#   "image"  → uint8 (224, 224)     ~49 KB/clip (default; the 3 model
+#              channels are identical copies so nothing is lost)
+#   "tensor" → float32 (224, 224, 3) ~588 KB/clip, fed to predict() as-is
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from file_lock import FileLock
+
+IMAGE_SIZE = (224, 224)
+CHUNK_ROWS = int(os.getenv("CHILDEYE_FEATURE_CHUNK_ROWS", "1024"))
+LAYOUTS = {
+    "image":  (np.uint8,   IMAGE_SIZE),
+    "tensor": (np.float32, IMAGE_SIZE + (3,)),
+}
+
+
+def content_hash(file_bytes):
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def to_model_input(images):
+    """(N, 224, 224) uint8 → (N, 224, 224, 3) float32 in [0, 1]; tensors pass through."""
+    if images.dtype == np.float32:
+        return images
+    out = np.empty(images.shape + (3,), dtype=np.float32)
+    np.divide(images[..., None], np.float32(255), out=out, casting="unsafe")
+    return out
+
+
+# ============================================================
+# 🗄️ المخزن
+# ============================================================
+
+class FeatureStore:
+
+    def __init__(self, root, layout="image", chunk_rows=CHUNK_ROWS):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.index_path = os.path.join(root, "index.jsonl")
+        self.manifest_path = os.path.join(root, "store.json")
+        self._file_lock = FileLock(os.path.join(root, ".lock"))
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        else:
+            manifest = {"layout": layout, "chunk_rows": chunk_rows}
+            with open(self.manifest_path, "w") as f:
+                json.dump(manifest, f, indent=4)
+        self.layout = manifest["layout"]
+        self.chunk_rows = manifest["chunk_rows"]
+        self.dtype, self.row_shape = LAYOUTS[self.layout]
+
+        self._entries = []
+        self._by_hash = {}          # hash → entries of every child, [0] owns the row
+        self._rows = 0
+        self._index_offset = 0
+        self._chunks = {}           # read-only maps
+        self._write_chunks = {}     # read-write maps, only used by put()
+        self._refresh_index()
+
+    def __len__(self):
+        """Recorded (hash, child_id) pairs."""
+        return len(self._entries)
+
+    @property
+    def rows(self):
+        """Distinct clips stored in the chunks."""
+        return self._rows
+
+    def __contains__(self, h):
+        return h in self._by_hash
+
+    # ---------- index ----------
+
+    def _refresh_index(self):
+        # Other workers may have appended since we last looked.
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._add(json.loads(line))
+                self._index_offset += len(line)
+
+    def _add(self, entry):
+        self._entries.append(entry)
+        self._by_hash.setdefault(entry["hash"], []).append(entry)
+        self._rows = max(self._rows, entry["row"] + 1)
+
+    def _find(self, h, child_id):
+        for entry in self._by_hash.get(h, ()):
+            if entry.get("child_id") == child_id:
+                return entry
+        return None
+
+    def entries(self, child_id=None):
+        if child_id is None:
+            return list(self._entries)
+        return [e for e in self._entries if e.get("child_id") == child_id]
+
+    def has(self, h, child_id=None):
+        """True once this child's upload of the clip is recorded."""
+        if self._find(h, child_id) is None:
+            with self._lock:
+                self._refresh_index()
+        return self._find(h, child_id) is not None
+
+    def recordings(self, h):
+        """Every (hash, child_id) entry of one clip."""
+        return list(self._by_hash.get(h, ()))
+
+    def clips(self):
+        """One entry per stored row, in row order."""
+        return [entries[0] for entries in self._by_hash.values()]
+
+    # ---------- chunks ----------
+
+    def _chunk_path(self, chunk):
+        return os.path.join(self.root, f"chunk_{chunk:05d}.npy")
+
+    def _chunk(self, chunk):
+        mm = self._chunks.get(chunk)
+        if mm is None:
+            mm = np.load(self._chunk_path(chunk), mmap_mode="r")
+            self._chunks[chunk] = mm
+        return mm
+
+    def _writable_chunk(self, chunk):
+        mm = self._write_chunks.get(chunk)
+        if mm is not None:
+            return mm
+        path = self._chunk_path(chunk)
+        if os.path.exists(path):
+            mm = np.load(path, mmap_mode="r+")
+        else:
+            mm = np.lib.format.open_memmap(
+                path, mode="w+", dtype=self.dtype, shape=(self.chunk_rows,) + self.row_shape)
+        self._write_chunks[chunk] = mm
+        return mm
+
+    # ---------- read / write ----------
+
+    def get(self, h):
+        """Zero-copy read-only view of one stored clip, or None."""
+        if h not in self._by_hash:
+            with self._lock:
+                self._refresh_index()
+            if h not in self._by_hash:
+                return None
+        row = self._by_hash[h][0]["row"]
+        return self._chunk(row // self.chunk_rows)[row % self.chunk_rows]
+
+    def put(self, h, features, child_id=None, label=None):
+        features = np.asarray(features)
+        if self.layout == "tensor" and features.dtype == np.uint8:
+            features = to_model_input(features[None])[0]
+        if features.shape != self.row_shape:
+            raise ValueError(f"Expected features of shape {self.row_shape}, got {features.shape}")
+
+        with self._lock, self._file_lock:
+            self._refresh_index()
+            existing = self._find(h, child_id)
+            if existing is not None:
+                return existing
+
+            if h in self._by_hash:
+                # Same clip from another child: share the stored row.
+                row = self._by_hash[h][0]["row"]
+            else:
+                row = self._rows
+                mm = self._writable_chunk(row // self.chunk_rows)
+                mm[row % self.chunk_rows] = features
+                mm.flush()
+
+            entry = {
+                "hash": h,
+                "child_id": child_id,
+                "row": row,
+                "label": label,
+                "created_at": datetime.now().isoformat(),
+            }
+            line = (json.dumps(entry) + "\n").encode("utf-8")
+            with open(self.index_path, "ab") as f:
+                f.write(line)
+            self._add(entry)
+            self._index_offset += len(line)
+            return entry
+
+    def iter_batches(self, batch_size=64, child_id=None):
+        """Yield (entries, features), one entry per stored clip (or per clip of
+        `child_id`). Runs of consecutive rows in one chunk are memmap slices
+        (no copy); a child_id filter gathers rows instead."""
+        with self._lock:
+            self._refresh_index()
+        entries = self.clips() if child_id is None else self.entries(child_id)
+
+        start = 0
+        while start < len(entries):
+            first = entries[start]["row"]
+            chunk = first // self.chunk_rows
+            end = start + 1
+            while (end < len(entries) and end - start < batch_size
+                   and entries[end]["row"] == first + (end - start)
+                   and entries[end]["row"] // self.chunk_rows == chunk):
+                end += 1
+
+            mm = self._chunk(chunk)
+            if child_id is None or end - start > 1:
+                offset = first % self.chunk_rows
+                yield entries[start:end], mm[offset:offset + (end - start)]
+                start = end
+                continue
+
+            # Scattered rows of one child: gather up to batch_size of them.
+            batch = entries[start:start + batch_size]
+            yield batch, np.stack([self.get(e["hash"]) for e in batch])
+            start += len(batch)
+
+
+# ============================================================
+# 🔁 إعادة التقييم الجماعي بدون فك الصوت
+# ============================================================
+
+def rescore(store, model, classes, batch_size=64, child_id=None, out=None):
+    n = 0
+    t0 = time.time()
+    for entries, feats in store.iter_batches(batch_size, child_id):
+        preds = model.predict(to_model_input(feats), verbose=0)
+        preds = preds / (np.sum(preds, axis=1, keepdims=True) + 1e-8)
+        top = np.argmax(preds, axis=1)
+        for e, i, p in zip(entries, top, preds):
+            # A shared clip is scored once and reported for every child.
+            for rec in (store.recordings(e["hash"]) if child_id is None else [e]):
+                row = {
+                    "hash": rec["hash"],
+                    "child_id": rec.get("child_id"),
+                    "stored_label": rec.get("label"),
+                    "cry_type": classes[int(i)],
+                    "confidence": float(p[i]),
+                }
+                if out:
+                    out.write(json.dumps(row) + "\n")
+        n += len(entries)
+    elapsed = time.time() - t0
+    print(f"✅ Re-scored {n} clips in {elapsed:.1f}s ({n / max(elapsed, 1e-9):.0f} clips/s)",
+          file=sys.stderr)
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Child-Eye cry feature store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("rescore", help="run a cry model over every stored clip")
+    p.add_argument("--store", required=True)
+    p.add_argument("--model", required=True, help="path to a .keras cry model")
+    p.add_argument("--meta", help="model meta JSON with output_classes")
+    p.add_argument("--batch", type=int, default=64)
+    p.add_argument("--child-id", type=int)
+    p.add_argument("--out", help="write one JSON line per clip (default: stdout)")
+
+    p = sub.add_parser("stats", help="print store size and layout")
+    p.add_argument("--store", required=True)
+
+    args = parser.parse_args(argv)
+    store = FeatureStore(args.store)
+
+    if args.cmd == "stats":
+        children = {e.get("child_id") for e in store.entries()}
+        print(json.dumps({
+            "clips": store.rows,
+            "recordings": len(store),
+            "children": len(children),
+            "layout": store.layout,
+            "chunk_rows": store.chunk_rows,
+        }, indent=4))
+        return
+
+    from tensorflow import keras
+    model = keras.models.load_model(args.model)
+    classes = ["hungry", "pain", "laugh", "noise", "cold_hot", "silence"]
+    if args.meta:
+        with open(args.meta, "r") as f:
+            classes = json.load(f).get("output_classes", classes)
+
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        rescore(store, model, classes, args.batch, args.child_id, out)
+    finally:
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
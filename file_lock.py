@@ -0,0 +1,102 @@
+# ============================================================
+# 🔒 Child-Eye File Lock — Cross-Process Lock + Atomic Writes
+# ============================================================
+#
+# The production server runs several worker processes that share files
+# (feature store index, model version choice, digital twin state). A lock
+# file created with O_EXCL serializes them on Windows and Linux alike, and
+# JSON is written to a temp file then os.replace()d, so a reader always
+# sees either the old or the new file, never half of one.
+
+import os
+import json
+import time
+import threading
+
+
+class FileLock:
+
+    def __init__(self, path, stale_after=30):
+        self.path = path
+        self.stale_after = stale_after
+
+    def __enter__(self):
+        # A unique token identifies this holder's file (inode numbers and
+        # coarse mtimes are reused right after a delete).
+        token = f"{os.getpid()}-{threading.get_ident()}-{time.time_ns()}".encode()
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                try:
+                    os.write(fd, token)
+                finally:
+                    os.close(fd)
+                self._token = token
+                return self
+            except FileExistsError:
+                try:
+                    # Token first: if the file is replaced before the mtime
+                    # check, the new holder's fresh mtime prevents a break.
+                    seen = _read_token(self.path)
+                    if time.time() - os.path.getmtime(self.path) > self.stale_after:
+                        self._break(seen)
+                        continue
+                except OSError:
+                    continue
+                time.sleep(0.005)
+
+    def _break(self, seen):
+        # Another waiter may have broken the same stale lock and taken a new
+        # one meanwhile: move the file aside (atomic, one waiter wins) and
+        # only delete it if it is still the holder that was seen as stale.
+        aside = _tmp_path(self.path) + ".stale"
+        os.rename(self.path, aside)
+        if _read_token(aside) == seen:
+            os.remove(aside)
+            return
+        # A live lock was moved: put it back unless the path was taken again.
+        try:
+            os.link(aside, self.path)
+        finally:
+            os.remove(aside)
+
+    def __exit__(self, *exc):
+        # If this lock was broken as stale, the file may now be someone else's.
+        try:
+            if _read_token(self.path) == self._token:
+                os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _read_token(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _tmp_path(path):
+    return f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+
+def atomic_write_json(path, data, **kwargs):
+    tmp = _tmp_path(path)
+    with open(tmp, "w") as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp, path)
+
+
+def atomic_copy(src, dst):
+    tmp = _tmp_path(dst)
+    with open(src, "rb") as fin, open(tmp, "wb") as fout:
+        for block in iter(lambda: fin.read(1 << 20), b""):
+            fout.write(block)
+    os.replace(tmp, dst)
+
+
+def read_json(path, default=None):
+    """Missing file → default; a corrupt file raises instead of being treated as empty."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
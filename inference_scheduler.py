@@ -0,0 +1,215 @@
+# ============================================================
+# 🚦 Child-Eye Inference Scheduler — Priority Admission Control
+# ============================================================
+#
+# Every model gets a gate with a concurrency cap. Waiting requests are
+# admitted by priority class (realtime → backlog → batch, FIFO inside a
+# class) and shed with DeadlineExceeded once their deadline passes, so a
+# burst of batch work can never starve a live cry clip.
+
+import os
+import math
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# ============================================================
+# 🔹 الإعدادات
+# ============================================================
+
+PRIORITIES = {"realtime": 0, "backlog": 1, "batch": 2}
+
+DEFAULT_DEADLINES = {
+    "realtime": float(os.getenv("CHILDEYE_DEADLINE_REALTIME", "2")),
+    "backlog":  float(os.getenv("CHILDEYE_DEADLINE_BACKLOG", "30")),
+    "batch":    float(os.getenv("CHILDEYE_DEADLINE_BATCH", "300")),
+}
+
+DEFAULT_CONCURRENCY = int(os.getenv("CHILDEYE_MODEL_CONCURRENCY", "2"))
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def concurrency_for(name, default=DEFAULT_CONCURRENCY):
+    """Per-model cap, e.g. CHILDEYE_CONCURRENCY_CRY_ANALYSIS=4."""
+    return int(os.getenv(f"CHILDEYE_CONCURRENCY_{name.upper()}", default))
+
+
+# ============================================================
+# 🧵 إعداد خيوط TensorFlow
+# ============================================================
+
+def configure_tf_threads(intra=None, inter=None):
+    """Must run before the first TensorFlow op (i.e. before loading models)."""
+    intra = intra if intra is not None else int(os.getenv("CHILDEYE_TF_INTRA_OP_THREADS", "0"))
+    inter = inter if inter is not None else int(os.getenv("CHILDEYE_TF_INTER_OP_THREADS", "0"))
+    if not intra and not inter:
+        return False
+
+    import tensorflow as tf
+    try:
+        if intra:
+            tf.config.threading.set_intra_op_parallelism_threads(intra)
+        if inter:
+            tf.config.threading.set_inter_op_parallelism_threads(inter)
+    except RuntimeError as e:
+        print(f"⚠️ TF thread settings ignored (runtime already initialized): {e}")
+        return False
+    print(f"🧵 TensorFlow threads → intra_op={intra or 'default'}, inter_op={inter or 'default'}")
+    return True
+
+
+# ============================================================
+# 📊 إحصائيات كل فئة
+# ============================================================
+
+class ClassStats:
+
+    def __init__(self):
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent = deque(maxlen=256)
+
+    def record(self, waited):
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.recent.append(waited)
+
+    def snapshot(self):
+        recent = sorted(self.recent)
+        # Nearest-rank percentile: the smallest wait >= 95% of the samples.
+        p95 = recent[math.ceil(0.95 * len(recent)) - 1] if recent else 0.0
+        return {
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_wait_ms": round(1000 * self.total_wait / self.admitted, 2) if self.admitted else 0.0,
+            "p95_wait_ms": round(1000 * p95, 2),
+            "max_wait_ms": round(1000 * self.max_wait, 2),
+        }
+
+
+# ============================================================
+# 🚪 بوابة موديل واحد
+# ============================================================
+
+class _ModelGate:
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = max(1, int(limit))
+        self.running = 0
+        self.queue = []
+        self.cond = threading.Condition()
+        self.stats = {cls: ClassStats() for cls in PRIORITIES}
+
+
+class InferenceScheduler:
+
+    def __init__(self, names=(), default_limit=DEFAULT_CONCURRENCY, deadlines=None):
+        self.default_limit = default_limit
+        self.deadlines = {**DEFAULT_DEADLINES, **(deadlines or {})}
+        self._gates = {}
+        self._seq = itertools.count()
+        for name in names:
+            self.register(name)
+
+    def register(self, name, limit=None):
+        limit = limit if limit is not None else concurrency_for(name, self.default_limit)
+        self._gates[name] = _ModelGate(name, limit)
+        return self._gates[name]
+
+    def _gate(self, name):
+        gate = self._gates.get(name)
+        return gate if gate is not None else self.register(name)
+
+    # ---------- admission ----------
+
+    def _admit(self, gate, priority, expires_at):
+        stats = gate.stats[priority]
+        entry = (PRIORITIES[priority], next(self._seq))
+        queued_at = time.monotonic()
+
+        with gate.cond:
+            heapq.heappush(gate.queue, entry)
+            stats.waiting += 1
+            while True:
+                if gate.queue[0] == entry and gate.running < gate.limit:
+                    heapq.heappop(gate.queue)
+                    gate.running += 1
+                    stats.waiting -= 1
+                    stats.record(time.monotonic() - queued_at)
+                    # The next head may also fit under the cap.
+                    gate.cond.notify_all()
+                    return
+
+                remaining = expires_at - time.monotonic()
+                if remaining <= 0:
+                    gate.queue.remove(entry)
+                    heapq.heapify(gate.queue)
+                    stats.waiting -= 1
+                    stats.shed += 1
+                    gate.cond.notify_all()
+                    raise DeadlineExceeded(
+                        f"{gate.name}: {priority} request shed after "
+                        f"{1000 * (time.monotonic() - queued_at):.0f} ms in queue"
+                    )
+                gate.cond.wait(remaining)
+
+    def _release(self, gate):
+        with gate.cond:
+            gate.running -= 1
+            gate.cond.notify_all()
+
+    @contextmanager
+    def slot(self, name, priority="realtime", deadline=None, started_at=None):
+        """Hold one concurrency slot of `name`; deadline is seconds from `started_at`."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        gate = self._gate(name)
+        started_at = started_at if started_at is not None else time.monotonic()
+        budget = deadline if deadline is not None else self.deadlines[priority]
+
+        self._admit(gate, priority, started_at + budget)
+        try:
+            yield
+        finally:
+            self._release(gate)
+
+    def run(self, name, fn, *args, priority="realtime", deadline=None, **kwargs):
+        with self.slot(name, priority, deadline):
+            return fn(*args, **kwargs)
+
+    # ---------- stats ----------
+
+    def stats(self):
+        totals = {cls: ClassStats() for cls in PRIORITIES}
+        per_model = {}
+        for name, gate in self._gates.items():
+            with gate.cond:
+                per_model[name] = {
+                    "limit": gate.limit,
+                    "running": gate.running,
+                    "classes": {cls: s.snapshot() for cls, s in gate.stats.items()},
+                }
+                for cls, s in gate.stats.items():
+                    t = totals[cls]
+                    t.waiting += s.waiting
+                    t.admitted += s.admitted
+                    t.shed += s.shed
+                    t.total_wait += s.total_wait
+                    t.max_wait = max(t.max_wait, s.max_wait)
+                    t.recent.extend(s.recent)
+        return {
+            "classes": {cls: t.snapshot() for cls, t in totals.items()},
+            "models": per_model,
+        }
@@ -0,0 +1,44 @@
+# ============================================================
+# 🗂️ Child-Eye Model Paths
+# ============================================================
+#
+# Model + metadata locations shared by the server and the standalone
+# tools (fleet ticker), kept apart from server_main so importing them
+# does not load TensorFlow or any model.
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_MODELS_DIR = os.getenv(
+    "CHILDEYE_MODELS_DIR", r"C:\Users\dhayq\Desktop\GP-Code\ChildEyeServer\ChildEye_Models")
+
+MODEL_PATHS = {
+    "face_detection": {
+        "model": os.path.join(BASE_MODELS_DIR, "FaceEmotion_Model", "best_face_model.keras"),
+        "meta":  os.path.join(BASE_MODELS_DIR, "FaceEmotion_Model", "best_face_model_meta.json"),
+        "type": "keras",
+    },
+    "cry_analysis": {
+        "model": os.path.join(BASE_MODELS_DIR, "CryAnalysis_Model", "CryAnalysis_Model.keras"),
+        "meta":  os.path.join(BASE_MODELS_DIR, "CryAnalysis_Model", "CryAnalysis_Model_meta.json"),
+        "type": "keras",
+    },
+    "fusion_hr_rr": {
+        "model": os.path.join(BASE_MODELS_DIR, "Fusion_Model_HR_RR", "best_fusion_model.keras"),
+        "meta":  os.path.join(BASE_MODELS_DIR, "Fusion_Model_HR_RR", "best_fusion_model_meta.json"),
+        "type": "keras",
+    },
+    "sleep_rules": {
+        "model": os.path.join(BASE_MODELS_DIR, "SleepRules", "sleep_rules.py"),
+        "meta":  os.path.join(BASE_MODELS_DIR, "SleepRules", "sleep_rules_meta.json"),
+        "type": "rule",
+    },
+    "temperature_rules": {
+        "model": os.path.join(BASE_MODELS_DIR, "TemperatureRules", "temp_rules.py"),
+        "meta":  os.path.join(BASE_MODELS_DIR, "TemperatureRules", "temp_rules_meta.json"),
+        "type": "rule",
+    },
+}
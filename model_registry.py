@@ -0,0 +1,367 @@
+# ============================================================
+# 🗃️ Child-Eye Model Registry — Versioned Hot-Swap
+# ============================================================
+#
+# Every Keras model in MODELS gets a version (file mtime + content hash).
+# A new .keras file is loaded and warmed up in a background thread, then
+# swapped in with one dict assignment. Requests that already hold the old
+# version finish on it; the previous version is kept for rollback.
+#
+# The version choice is shared by all worker processes through
+#   <model dir>/versions/<name>/active.json   {"current", "previous", ...}
+#   <model dir>/versions/<name>/<version>.keras (+ .meta.json snapshot)
+# A new file on disk, POST /models/<name>/reload and /rollback only update
+# active.json (under a file lock); every worker polls it and converges on
+# the chosen version within CHILDEYE_MODEL_SYNC_SECONDS. Restarted workers
+# (SIGHUP) load the chosen version at startup, so swaps and rollbacks
+# survive a rolling restart.
+#
+# Memory stays bounded per worker: at most one background load runs at a
+# time, and only `current` + one `previous` version are referenced per model.
+
+import os
+import gc
+import time
+import hashlib
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+import numpy as np
+from tensorflow import keras
+
+from file_lock import FileLock, atomic_copy, atomic_write_json, read_json
+
+KEEP_PREVIOUS = os.getenv("CHILDEYE_KEEP_PREVIOUS_MODEL", "1") == "1"
+POLL_SECONDS = float(os.getenv("CHILDEYE_MODEL_POLL_SECONDS", "10"))
+SYNC_SECONDS = float(os.getenv("CHILDEYE_MODEL_SYNC_SECONDS", "1"))
+
+
+# ============================================================
+# 🔖 نسخة موديل واحدة
+# ============================================================
+
+class ModelVersion:
+
+    def __init__(self, name, model, meta, path, version, mtime):
+        self.name = name
+        self.model = model
+        self.meta = meta
+        self.path = path
+        self.version = version
+        self.mtime = mtime
+        self.loaded_at = datetime.now().isoformat()
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.inflight += 1
+
+    def leave(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "inflight": self.inflight,
+        }
+
+
+def file_version(path):
+    """`<mtime>-<sha1[:8]>` — stable id of a model file on disk."""
+    st = os.stat(path)
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    stamp = datetime.fromtimestamp(st.st_mtime).strftime("%Y%m%d%H%M%S")
+    return f"{stamp}-{h.hexdigest()[:8]}", st.st_mtime_ns
+
+
+def warm_up(model):
+    """Run one dummy predict so graph tracing happens before the swap."""
+    inputs = []
+    for tensor in model.inputs:
+        shape = [1 if d is None else d for d in tensor.shape]
+        inputs.append(np.zeros(shape, dtype=np.float32))
+    model.predict(inputs if len(inputs) > 1 else inputs[0], verbose=0)
+
+
+# ============================================================
+# 📚 السجل
+# ============================================================
+
+class ModelRegistry:
+
+    def __init__(self, paths, models=None, keep_previous=KEEP_PREVIOUS,
+                 poll_seconds=POLL_SECONDS, sync_seconds=SYNC_SECONDS):
+        self.paths = {n: info for n, info in paths.items() if info.get("type") == "keras"}
+        self.models = models if models is not None else {}
+        self.keep_previous = keep_previous
+        self.poll_seconds = poll_seconds
+        self.sync_seconds = sync_seconds
+
+        self._current = {}
+        self._previous = {}
+        self._loading = set()
+        self._swap_lock = threading.Lock()
+        self._load_slot = threading.Semaphore(1)
+        self._seen_mtimes = {}
+        self._attempted = {}
+        self._failed = {}
+        self._watcher = None
+        self._stop = threading.Event()
+
+        for name, entry in self.models.items():
+            if name in self.paths and "model" in entry:
+                self._adopt(name, entry)
+        # A restarted worker follows the shared choice before serving.
+        self.sync(block=True)
+
+    def _adopt(self, name, entry):
+        path = self.paths[name]["model"]
+        version, mtime = file_version(path)
+        mv = ModelVersion(name, entry["model"], entry.get("meta", {}), path, version, mtime)
+        self._current[name] = mv
+        self.models[name] = {**entry, "version": version}
+        print(f"🔖 {name} → version {version}")
+
+        # A file newer than the shared choice is a new deployment.
+        active = self.active(name)
+        if active is None or active.get("source_mtime") != mtime:
+            self.publish(name, version, mtime)
+
+    # ---------- shared version choice ----------
+
+    def _versions_dir(self, name):
+        return os.path.join(os.path.dirname(self.paths[name]["model"]), "versions", name)
+
+    def _active_path(self, name):
+        return os.path.join(self._versions_dir(name), "active.json")
+
+    def _snapshot(self, name, version):
+        base = os.path.join(self._versions_dir(name), version)
+        return base + ".keras", base + ".meta.json"
+
+    def _file_lock(self, name):
+        return FileLock(self._active_path(name) + ".lock")
+
+    def active(self, name):
+        return read_json(self._active_path(name))
+
+    def publish(self, name, version=None, mtime=None):
+        """Make the model file on disk the current version of every worker."""
+        info = self.paths[name]
+        if version is None:
+            version, mtime = file_version(info["model"])
+        os.makedirs(self._versions_dir(name), exist_ok=True)
+        model_snap, meta_snap = self._snapshot(name, version)
+        if not os.path.exists(model_snap):
+            atomic_copy(info["model"], model_snap)
+            if os.path.exists(info["meta"]):
+                atomic_copy(info["meta"], meta_snap)
+
+        with self._file_lock(name):
+            active = self.active(name) or {}
+            if active.get("source_mtime") == mtime and active.get("current") == version:
+                return False
+            if active.get("current") != version:
+                active = {"current": version, "previous": active.get("current")}
+            active.update(source_mtime=mtime, updated_at=datetime.now().isoformat())
+            atomic_write_json(self._active_path(name), active, indent=4)
+            self._prune(name, {active["current"], active.get("previous")})
+        print(f"📣 {name}: shared version → {version}")
+        return True
+
+    def _prune(self, name, keep):
+        for fname in os.listdir(self._versions_dir(name)):
+            version = fname.split(".", 1)[0]
+            if fname.endswith((".keras", ".meta.json")) and version not in keep:
+                try:
+                    os.remove(os.path.join(self._versions_dir(name), fname))
+                except OSError:
+                    pass
+
+    def sync(self, name=None, block=False):
+        """Follow active.json: swap to the in-memory previous or load the snapshot."""
+        for n in ([name] if name else list(self.paths)):
+            want = (self.active(n) or {}).get("current")
+            cur, prev = self._current.get(n), self._previous.get(n)
+            if (want is None or (cur and cur.version == want)
+                    or n in self._loading or self._failed.get(n) == want):
+                continue
+            if prev and prev.version == want:
+                self._swap_previous(n)
+            elif block:
+                self._apply(n, want)
+            else:
+                threading.Thread(target=self._apply, args=(n, want),
+                                 name=f"sync-{n}", daemon=True).start()
+
+    # ---------- access ----------
+
+    def current(self, name):
+        return self._current[name]
+
+    @contextmanager
+    def acquire(self, name):
+        """Pin the current version for the duration of one request."""
+        mv = self._current[name]
+        mv.enter()
+        try:
+            yield mv
+        finally:
+            mv.leave()
+
+    def versions(self):
+        out = {}
+        for name in self.paths:
+            cur = self._current.get(name)
+            prev = self._previous.get(name)
+            active = self.active(name) or {}
+            out[name] = {
+                "current": cur.describe() if cur else None,
+                "previous": prev.describe() if prev else None,
+                "loading": name in self._loading,
+                "shared": {"current": active.get("current"), "previous": active.get("previous")},
+                "pid": os.getpid(),
+            }
+        return out
+
+    # ---------- load / swap ----------
+
+    def load_version(self, name, version=None):
+        """Load + warm up a version (default: the file on disk); does not swap."""
+        info = self.paths[name]
+        if version is None:
+            path, meta_path = info["model"], info["meta"]
+            version, mtime = file_version(path)
+        else:
+            path, meta_path = self._snapshot(name, version)
+            mtime = os.stat(path).st_mtime_ns
+        meta = read_json(meta_path, self.models.get(name, {}).get("meta", {}))
+
+        with self._load_slot:
+            t0 = time.time()
+            model = keras.models.load_model(path)
+            warm_up(model)
+        print(f"📥 {name} v{version} loaded + warmed in {time.time() - t0:.1f}s")
+        return ModelVersion(name, model, meta, path, version, mtime)
+
+    def swap_in(self, mv):
+        with self._swap_lock:
+            old = self._current.get(mv.name)
+            evicted = self._previous.get(mv.name) if self.keep_previous else old
+            self._current[mv.name] = mv
+            self._previous[mv.name] = old if self.keep_previous else None
+            self.models[mv.name] = {"model": mv.model, "meta": mv.meta, "version": mv.version}
+        print(f"🔄 {mv.name}: {old.version if old else '-'} → {mv.version}")
+        # The evicted version is freed once its last in-flight request returns.
+        del old, evicted
+        gc.collect()
+
+    def _swap_previous(self, name):
+        with self._swap_lock:
+            prev = self._previous.get(name)
+            if prev is None:
+                return False
+            cur = self._current[name]
+            self._current[name] = prev
+            self._previous[name] = cur
+            self.models[name] = {"model": prev.model, "meta": prev.meta, "version": prev.version}
+        print(f"⏪ {name}: {cur.version} → {prev.version}")
+        return True
+
+    def _apply(self, name, version):
+        with self._swap_lock:
+            if name in self._loading:
+                return False
+            self._loading.add(name)
+        try:
+            cur = self._current.get(name)
+            if cur and cur.version == version:
+                return False
+            self.swap_in(self.load_version(name, version))
+            self._failed.pop(name, None)
+            return True
+        except Exception as e:
+            # Not retried until the shared choice changes again.
+            self._failed[name] = version
+            print(f"❌ Hot-swap of {name} to {version} failed, keeping current version: {e}")
+            return False
+        finally:
+            self._loading.discard(name)
+
+    def reload(self, name):
+        """Publish the file on disk for all workers and switch this one to it."""
+        if name not in self.paths:
+            raise KeyError(name)
+        try:
+            version, mtime = file_version(self.paths[name]["model"])
+            self.publish(name, version, mtime)
+        except Exception as e:
+            print(f"❌ Publishing {name} failed: {e}")
+            return False
+        return self._apply(name, version)
+
+    def reload_async(self, name):
+        t = threading.Thread(target=self.reload, args=(name,), name=f"reload-{name}", daemon=True)
+        t.start()
+        return t
+
+    def rollback(self, name):
+        """Make the shared previous version current again; returns it, or None."""
+        with self._file_lock(name):
+            active = self.active(name) or {}
+            target = active.get("previous")
+            if not target or not os.path.exists(self._snapshot(name, target)[0]):
+                return None
+            active.update(current=target, previous=active["current"],
+                          updated_at=datetime.now().isoformat())
+            atomic_write_json(self._active_path(name), active, indent=4)
+        print(f"⏪ {name}: shared version rolled back → {target}")
+        self.sync(name)
+        return target
+
+    # ---------- file watcher ----------
+
+    def check_for_changes(self):
+        for name, info in self.paths.items():
+            try:
+                mtime = os.stat(info["model"]).st_mtime_ns
+            except OSError:
+                continue
+            cur = self._current.get(name)
+            active = self.active(name) or {}
+            if ((cur and cur.mtime == mtime) or active.get("source_mtime") == mtime
+                    or self._attempted.get(name) == mtime):
+                continue
+            # Only reload once the file stopped changing for one poll interval.
+            if self._seen_mtimes.get(name) == mtime:
+                self._attempted[name] = mtime
+                self.reload_async(name)
+            self._seen_mtimes[name] = mtime
+
+    def _watch(self):
+        next_poll = time.monotonic() + self.poll_seconds
+        while not self._stop.wait(self.sync_seconds):
+            try:
+                self.sync()
+                if time.monotonic() >= next_poll:
+                    next_poll = time.monotonic() + self.poll_seconds
+                    self.check_for_changes()
+            except Exception as e:
+                print("model watcher error:", e)
+
+    def start_watcher(self):
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
@@ -0,0 +1,400 @@
+# ============================================================
+# 📐 Child-Eye Rule Engine — Compiled Decision Table
+# ============================================================
+#
+# The sleep / temperature rule metadata (sleep_rules_meta.json,
+# temp_rules_meta.json) is compiled into one flat decision table
+# which is evaluated with NumPy over whole batches of readings.
+# When a rule file changes on disk the table is recompiled in a
+# background thread and swapped in with a single assignment, so
+# requests never wait on a reload.
+
+import os
+import json
+import threading
+import numpy as np
+
+# ============================================================
+# 🔹 الحقول المدعومة وترتيب مجموعات القواعد
+# ============================================================
+
+NUMERIC_FIELDS = ("hr", "rr", "temp")
+CATEGORICAL_FIELDS = ("face_emotion", "cry_emotion", "sleep_state", "reason")
+
+# Groups are applied in this order; a later group overrides an earlier one,
+# inside a group the first matching rule wins (if / elif).
+GROUP_ORDER = ["temperature", "vitals", "face", "cry"]
+
+DEFAULT_STATUS = "normal"
+DEFAULT_REASON = "stable and healthy"
+
+POLL_SECONDS = float(os.getenv("CHILDEYE_RULES_POLL_SECONDS", "2"))
+
+# ============================================================
+# 📋 القواعد الافتراضية (نفس منطق analyze_child_state)
+# ============================================================
+
+DEFAULT_RULES = [
+    # 🌡️ الحرارة
+    {"group": "temperature", "any": [["temp", ">=", 39]],
+     "status": "alert", "reason": "High fever (>39°C)"},
+    {"group": "temperature", "any": [["temp", ">=", 38]],
+     "status": "warning", "reason": "Mild fever"},
+    {"group": "temperature", "any": [["temp", "<", 36]],
+     "status": "warning", "reason": "Low body temperature"},
+
+    # ❤️‍🔥 HR/RR
+    {"group": "vitals", "requires": ["hr", "rr"],
+     "any": [["hr", ">", 140], ["rr", ">", 45]],
+     "status": "alert", "reason": "High HR/RR → stress or pain"},
+    {"group": "vitals", "requires": ["hr", "rr"],
+     "any": [["hr", "<", 90], ["rr", "<", 20]],
+     "status": "warning", "reason": "Low HR/RR → deep sleep"},
+
+    # 🙂 الوجه
+    {"group": "face", "any": [["face_emotion", "==", "cry"]],
+     "status": "alert", "reason": "Face shows crying/distress"},
+    {"group": "face", "any": [["face_emotion", "==", "sleep"]],
+     "status": "sleeping", "reason": "Eyes closed, calm expression"},
+
+    # 🔊 البكاء
+    {"group": "cry", "any": [["cry_emotion", "in", ["pain", "discomfort"]]],
+     "status": "alert", "reason": "Cry indicates pain"},
+    {"group": "cry", "any": [["cry_emotion", "==", "hungry"]],
+     "status": "warning", "reason": "Cry indicates hunger"},
+    {"group": "cry", "any": [["cry_emotion", "==", "laugh"]],
+     "status": None, "reason": "Baby laughing → positive mood"},
+]
+
+DEFAULT_CONFIDENCE = {
+    "base": 0.8,
+    "step": 0.05,
+    "max": 0.99,
+    "bonuses": [
+        {"all": [["face_emotion", "==", "cry"], ["cry_emotion", "in", ["pain"]]]},
+        {"all": [["temp", ">", 38], ["reason", "contains", "fever"]]},
+    ],
+}
+
+NUMERIC_OPS = {
+    ">":  np.greater,
+    ">=": np.greater_equal,
+    "<":  np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+CATEGORICAL_OPS = ("==", "!=", "in", "not_in", "contains")
+
+
+# ============================================================
+# 🧩 تحويل القراءات إلى أعمدة
+# ============================================================
+
+def to_columns(readings):
+    """Turn a list of reading dicts (or a dict of lists) into NumPy columns."""
+    if isinstance(readings, dict):
+        n = len(next(iter(readings.values()), []))
+        get = lambda key: readings.get(key, [None] * n)
+    else:
+        n = len(readings)
+        get = lambda key: [r.get(key) for r in readings]
+
+    columns = {}
+    for key in NUMERIC_FIELDS:
+        col = np.asarray(get(key), dtype=object)
+        mask = np.array([v is None for v in col], dtype=bool)
+        col[mask] = np.nan
+        columns[key] = col.astype(np.float64)
+    for key in CATEGORICAL_FIELDS:
+        if key == "reason":
+            continue
+        columns[key] = np.asarray(get(key), dtype=object).reshape(n)
+    return columns, n
+
+
+def _truthy(values):
+    if values.dtype == np.float64:
+        return ~np.isnan(values) & (values != 0)
+    return np.array([bool(v) for v in values], dtype=bool)
+
+
+# ============================================================
+# 🗂️ الجدول المُجمّع (Flat Decision Table)
+# ============================================================
+
+class CompiledRules:
+    """Immutable flat decision table; safe to share between threads."""
+
+    def __init__(self, rules, confidence, version=0):
+        self.version = version
+        self.confidence = {**DEFAULT_CONFIDENCE, **(confidence or {})}
+
+        # One row per clause: (rule index, kind, field, op, value)
+        self.clauses = []
+        self.rules = []
+        order = list(GROUP_ORDER)
+        for rule in rules:
+            group = rule.get("group", "custom")
+            if group not in order:
+                order.append(group)
+            idx = len(self.rules)
+            for kind in ("all", "any"):
+                for clause in rule.get(kind, []):
+                    self.clauses.append(_compile_clause(idx, kind, clause))
+            self.rules.append({
+                "group": group,
+                "requires": tuple(rule.get("requires", ())),
+                "status": rule.get("status"),
+                "reason": rule.get("reason"),
+            })
+
+        self.groups = [
+            [i for i, r in enumerate(self.rules) if r["group"] == g]
+            for g in order
+        ]
+        self.bonuses = [
+            [_compile_clause(i, "all", c) for c in bonus.get("all", [])]
+            for i, bonus in enumerate(self.confidence.get("bonuses", []))
+        ]
+
+    def _rule_masks(self, columns, n):
+        all_mask = np.ones((len(self.rules), n), dtype=bool)
+        any_mask = np.zeros((len(self.rules), n), dtype=bool)
+        has_any = np.zeros(len(self.rules), dtype=bool)
+
+        for rule_idx, kind, field, op, value in self.clauses:
+            hit = _eval_clause(columns[field], op, value)
+            if kind == "all":
+                all_mask[rule_idx] &= hit
+            else:
+                any_mask[rule_idx] |= hit
+                has_any[rule_idx] = True
+
+        any_mask[~has_any] = True
+        masks = all_mask & any_mask
+        for i, rule in enumerate(self.rules):
+            for field in rule["requires"]:
+                masks[i] &= _truthy(columns[field])
+        return masks
+
+    def evaluate(self, columns, n):
+        status = np.full(n, DEFAULT_STATUS, dtype=object)
+        reason = np.full(n, DEFAULT_REASON, dtype=object)
+        masks = self._rule_masks(columns, n)
+
+        for group in self.groups:
+            taken = np.zeros(n, dtype=bool)
+            for i in group:
+                hit = masks[i] & ~taken
+                if not hit.any():
+                    continue
+                rule = self.rules[i]
+                if rule["status"] is not None:
+                    status[hit] = rule["status"]
+                if rule["reason"] is not None:
+                    reason[hit] = rule["reason"]
+                taken |= hit
+
+        # 🔗 دمج المؤشرات → الثقة
+        cols = dict(columns, reason=reason)
+        matches = np.zeros(n, dtype=np.int64)
+        for bonus in self.bonuses:
+            hit = np.ones(n, dtype=bool)
+            for _, _, field, op, value in bonus:
+                hit &= _eval_clause(cols[field], op, value)
+            matches += hit
+
+        conf = self.confidence
+        confidence = np.minimum(conf["base"] + matches * conf["step"], conf["max"])
+        return {
+            "status": status,
+            "reason": reason,
+            "confidence": np.round(confidence, 2),
+        }
+
+
+def _compile_clause(rule_idx, kind, clause):
+    field, op, value = clause
+    if field in NUMERIC_FIELDS:
+        if op not in NUMERIC_OPS:
+            raise ValueError(f"Unsupported numeric operator {op!r} for {field}")
+        value = float(value)
+    elif field in CATEGORICAL_FIELDS:
+        if op not in CATEGORICAL_OPS:
+            raise ValueError(f"Unsupported operator {op!r} for {field}")
+        if op in ("in", "not_in"):
+            value = np.asarray(list(value), dtype=object)
+    else:
+        raise ValueError(f"Unknown rule field: {field}")
+    return rule_idx, kind, field, op, value
+
+
+def _eval_clause(values, op, value):
+    if values.dtype == np.float64:
+        with np.errstate(invalid="ignore"):
+            return NUMERIC_OPS[op](values, value)
+    if op == "==":
+        return values == value
+    if op == "!=":
+        return values != value
+    if op == "in":
+        return np.isin(values, value)
+    if op == "not_in":
+        return ~np.isin(values, value)
+    return np.array([isinstance(v, str) and value in v for v in values], dtype=bool)
+
+
+# ============================================================
+# ♻️ المحرك مع إعادة التحميل الساخن
+# ============================================================
+
+class RuleEngine:
+
+    def __init__(self, meta_paths=(), poll_seconds=POLL_SECONDS):
+        self.meta_paths = list(meta_paths)
+        self.poll_seconds = poll_seconds
+        self._mtimes = self._stat_all()
+        self._version = 0
+        self._reload_lock = threading.Lock()
+        try:
+            self._table = self._compile(self._version)
+        except Exception as e:
+            # A broken metadata file must not keep the server from starting;
+            # the watcher keeps retrying it until it compiles.
+            print(f"⚠️ Rule metadata invalid, using the default rules: {e}")
+            self._table = self._compile(self._version, meta_paths=())
+            self._mtimes = {}
+        self._watcher = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_paths(cls, paths, **kwargs):
+        """Build from a {name: {"model", "meta", "type"}} mapping (rule entries only)."""
+        metas = [info["meta"] for info in paths.values() if info.get("type") == "rule"]
+        return cls(metas, **kwargs)
+
+    @property
+    def version(self):
+        return self._table.version
+
+    # ---------- compile / reload ----------
+
+    def _stat_all(self):
+        mtimes = {}
+        for path in self.meta_paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def _compile(self, version, meta_paths=None):
+        # Metadata files override the default rules group by group.
+        groups = {}
+        for rule in DEFAULT_RULES:
+            groups.setdefault(rule["group"], []).append(rule)
+        confidence = dict(DEFAULT_CONFIDENCE)
+
+        for path in self.meta_paths if meta_paths is None else meta_paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            overrides = {}
+            for rule in meta.get("rules", []):
+                overrides.setdefault(rule.get("group", "custom"), []).append(rule)
+            groups.update(overrides)
+            confidence.update(meta.get("confidence", {}))
+
+        rules = [r for rs in groups.values() for r in rs]
+        return CompiledRules(rules, confidence, version=version)
+
+    def reload(self):
+        """Recompile now; on error the previous table stays active."""
+        with self._reload_lock:
+            return self._reload()
+
+    def _reload(self):
+        # Caller holds _reload_lock. The files are only marked as seen (and
+        # the version bumped) once they compiled, so a failed reload is
+        # retried on the next poll.
+        mtimes = self._stat_all()
+        try:
+            table = self._compile(self._version + 1)
+        except Exception as e:
+            print(f"⚠️ Rule reload failed, keeping v{self._table.version}: {e}")
+            return False
+        self._version = table.version
+        self._mtimes = mtimes
+        self._table = table
+        print(f"🔁 Rules reloaded → v{table.version}")
+        return True
+
+    def check_for_changes(self):
+        with self._reload_lock:
+            if self._stat_all() == self._mtimes:
+                return False
+            return self._reload()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.check_for_changes()
+            except Exception as e:
+                print("rule watcher error:", e)
+
+    def start_watcher(self):
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="rule-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+
+    # ---------- evaluation ----------
+
+    def evaluate_batch(self, readings):
+        """Vectorized evaluation; returns {"status", "reason", "confidence"} arrays."""
+        table = self._table
+        columns, n = to_columns(readings)
+        return table.evaluate(columns, n)
+
+    def evaluate_columns(self, columns, n):
+        return self._table.evaluate(columns, n)
+
+    def analyze(self, face_emotion=None, cry_emotion=None,
+                hr=None, rr=None, temp=None, sleep_state=None):
+        out = self.evaluate_batch([{
+            "face_emotion": face_emotion, "cry_emotion": cry_emotion,
+            "hr": hr, "rr": rr, "temp": temp, "sleep_state": sleep_state,
+        }])
+        return {
+            "status": out["status"][0],
+            "reason": out["reason"][0],
+            "confidence": float(out["confidence"][0]),
+        }
+
+
+# ============================================================
+# 🔧 المحرك المشترك للعملية
+# ============================================================
+
+_ENGINE = None
+_ENGINE_LOCK = threading.Lock()
+
+
+def set_rule_engine(engine):
+    global _ENGINE
+    _ENGINE = engine
+
+
+def get_rule_engine():
+    global _ENGINE
+    if _ENGINE is None:
+        with _ENGINE_LOCK:
+            if _ENGINE is None:
+                _ENGINE = RuleEngine()
+    return _ENGINE
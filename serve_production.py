@@ -0,0 +1,282 @@
+# ============================================================
+# 🏭 Child-Eye Production Server — Pre-fork Workers
+# ============================================================
+#
+# The master process only binds the listening socket and forks N workers;
+# it never imports server_main or TensorFlow. TensorFlow's runtime (thread
+# pools, allocator, eager context) is not fork-safe, so every worker starts
+# it itself after fork(): applies its own TF thread settings, loads the
+# models and serves requests on a bounded thread pool.
+#
+# Memory: each worker holds its own TensorFlow runtime and its own copy of
+# every model — about 0.8 GB RSS per worker measured with bench_serving.py,
+# plus the real models' weights. --workers therefore defaults to 2 (1 on a
+# single core), not one per core; raise it only with RAM for N × that.
+#
+#   python serve_production.py --workers 4 --threads 4 --port 5000
+#
+# Signals (master):
+#   SIGHUP           → graceful rolling restart of all workers
+#   SIGTERM / SIGINT → graceful shutdown (in-flight requests finish)
+#
+# Workers share the digital twin's lock + state files: point
+# CHILDEYE_TWIN_DIR (default: <CHILDEYE_MODELS_DIR>/DigitalTwin) at one
+# directory every worker can reach.
+#
+# Needs os.fork() (Linux / macOS). On Windows use `python server_main.py`.
+
+import os
+import sys
+import time
+import select
+import signal
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+
+# ============================================================
+# 🔹 الإعدادات
+# ============================================================
+
+DEFAULT_WORKERS = 2
+
+
+def parse_args(argv=None):
+    cpus = os.cpu_count() or 1
+    default_workers = min(DEFAULT_WORKERS, cpus)
+    parser = argparse.ArgumentParser(description="Child-Eye production server")
+    parser.add_argument("--host", default=os.getenv("CHILDEYE_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("CHILDEYE_PORT", "5000")))
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("CHILDEYE_WORKERS", str(default_workers))),
+                        help="worker processes, ~0.8 GB RSS each + model weights (default: 2)")
+    parser.add_argument("--threads", type=int,
+                        default=int(os.getenv("CHILDEYE_THREADS_PER_WORKER", "4")))
+    parser.add_argument("--tf-threads", type=int,
+                        default=int(os.getenv("CHILDEYE_TF_THREADS_PER_WORKER", "0")),
+                        help="TensorFlow intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0,
+                        help="seconds a restarted worker gets to load its models")
+    return parser.parse_args(argv)
+
+
+def configure_worker_env(args):
+    # Only environment variables here: each worker applies them through
+    # inference_scheduler.configure_tf_threads() when it imports server_main.
+    # An explicit --tf-threads wins over inherited environment values.
+    cpus = os.cpu_count() or 1
+    if args.tf_threads:
+        os.environ["CHILDEYE_TF_INTRA_OP_THREADS"] = str(args.tf_threads)
+    else:
+        os.environ.setdefault("CHILDEYE_TF_INTRA_OP_THREADS", str(max(1, cpus // max(1, args.workers))))
+    os.environ.setdefault("CHILDEYE_TF_INTER_OP_THREADS", "1")
+    os.environ["TF_NUM_INTRAOP_THREADS"] = os.environ["CHILDEYE_TF_INTRA_OP_THREADS"]
+    os.environ["TF_NUM_INTEROP_THREADS"] = os.environ["CHILDEYE_TF_INTER_OP_THREADS"]
+
+
+# ============================================================
+# 🌐 خادم WSGI بخيوط محدودة
+# ============================================================
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def start_pool(self, threads):
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        # Only accept when a thread is free; the rest wait in the kernel
+        # backlog where an idle sibling worker can pick them up.
+        self.slots = threading.BoundedSemaphore(threads)
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+
+# ============================================================
+# 👷 العامل
+# ============================================================
+
+def worker_main(server, args, index=0, ready_fd=None):
+    # Singleton jobs (e.g. the fleet tick) only run in worker 0.
+    os.environ["CHILDEYE_WORKER_INDEX"] = str(index)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # First TensorFlow use of this process: thread settings, then models.
+    import server_main
+    server.set_app(server_main.app)
+    server_main.start_background_services()
+    server.start_pool(args.threads)
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever returns → call it off-thread.
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    print(f"👷 worker {os.getpid()} ready ({args.threads} threads)", flush=True)
+    if ready_fd is not None:
+        os.write(ready_fd, b"1")
+        os.close(ready_fd)
+    server.serve_forever(poll_interval=0.5)
+    server.pool.shutdown(wait=True)
+
+    from DigitalTwin.digital_twin_core import flush_deferred_updates
+    flush_deferred_updates(timeout=args.graceful_timeout)
+    print(f"👋 worker {os.getpid()} stopped", flush=True)
+
+
+# ============================================================
+# 🧭 العملية الرئيسية
+# ============================================================
+
+class Master:
+
+    def __init__(self, server, args):
+        self.server = server
+        self.args = args
+        self.workers = {}
+        self.stopping = False
+        self.restart_requested = False
+
+    def spawn(self, index, notify=False):
+        # notify → the worker reports on a pipe once its models are loaded.
+        r, w = os.pipe() if notify else (None, None)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            if r is not None:
+                os.close(r)
+            try:
+                worker_main(self.server, self.args, index, w)
+            except Exception as e:
+                print(f"❌ worker {os.getpid()} crashed: {e}", flush=True)
+                code = 1
+            finally:
+                os._exit(code)
+        if w is not None:
+            os.close(w)
+        self.workers[pid] = index
+        return pid, r
+
+    def wait_ready(self, pid, fd, timeout):
+        try:
+            ready, _, _ = select.select([fd], [], [], timeout)
+            return bool(ready) and os.read(fd, 1) == b"1"
+        finally:
+            os.close(fd)
+
+    def stop_worker(self, pid, wait=True):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.workers.pop(pid, None)
+            return
+        if not wait:
+            return
+        deadline = time.time() + self.args.graceful_timeout
+        while time.time() < deadline:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done:
+                break
+            time.sleep(0.05)
+        else:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.workers.pop(pid, None)
+
+    def rolling_restart(self):
+        # Models load after fork, so keep the old worker serving until the
+        # new one has loaded them.
+        print("🔁 Rolling restart of workers...", flush=True)
+        for pid, index in list(self.workers.items()):
+            new_pid, fd = self.spawn(index, notify=True)
+            if not self.wait_ready(new_pid, fd, self.args.startup_timeout):
+                print(f"⚠️ worker {new_pid} not ready, keeping {pid}", flush=True)
+                self.stop_worker(new_pid)
+                continue
+            self.stop_worker(pid)
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.workers:
+                index = self.workers.pop(pid)
+                if not self.stopping:
+                    print(f"⚠️ worker {pid} exited ({status}), respawning", flush=True)
+                    self.spawn(index)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_hup)
+
+        for index in range(self.args.workers):
+            self.spawn(index)
+        print(f"🌍 Child-Eye master {os.getpid()} → {self.args.workers} workers on "
+              f"{self.args.host}:{self.args.port}", flush=True)
+
+        while not self.stopping:
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+            self.reap()
+            time.sleep(0.2)
+
+        for pid in list(self.workers):
+            self.stop_worker(pid, wait=False)
+        for pid in list(self.workers):
+            self.stop_worker(pid)
+        self.server.server_close()
+        print("🛑 Child-Eye master stopped", flush=True)
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_hup(self, signum, frame):
+        self.restart_requested = True
+
+
+def main(argv=None):
+    if not hasattr(os, "fork"):
+        sys.exit("serve_production.py needs os.fork(); use `python server_main.py` on Windows.")
+
+    args = parse_args(argv)
+    configure_worker_env(args)
+
+    # TensorFlow في الـ master يعني عمال قد يتجمدون داخل predict() بعد fork
+    if "tensorflow" in sys.modules:
+        sys.exit("TensorFlow was imported before fork(); workers would inherit its runtime.")
+
+    server = PooledWSGIServer((args.host, args.port), QuietHandler)
+    server.set_app(None)
+    Master(server, args).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 # 🌐 Child-Eye Unified Server — Full Production Version
 # ============================================================
 
-import os, io, json, traceback
+import os, io, json, time, traceback
 import numpy as np
 import librosa
 import mysql.connector
@@ -14,7 +14,17 @@ from PIL import Image
 
 # ChildEye Modules
 from db_connection import get_connection
-from DigitalTwin.digital_twin_core import update_twin_from_models
+from DigitalTwin.digital_twin_core import (
+    update_twin_from_models, analyze_twin_fast, submit_twin_update, get_latest_state
+)
+from DigitalTwin.fleet_tick import FleetTwin, FleetTicker, save_states, read_stale_snapshot
+from rule_engine import RuleEngine, set_rule_engine
+from model_paths import MODEL_PATHS
+from model_registry import ModelRegistry
+from feature_store import FeatureStore, content_hash, to_model_input
+from inference_scheduler import (
+    InferenceScheduler, DeadlineExceeded, PRIORITIES, configure_tf_threads
+)
 
 load_dotenv()
 
@@ -24,35 +34,7 @@ load_dotenv()
 
 def load_all_models():
     MODELS = {}
-    base = r"C:\Users\dhayq\Desktop\GP-Code\ChildEyeServer\ChildEye_Models"
-
-    paths = {
-        "face_detection": {
-            "model": f"{base}\\FaceEmotion_Model\\best_face_model.keras",
-            "meta":  f"{base}\\FaceEmotion_Model\\best_face_model_meta.json",
-            "type": "keras",
-        },
-        "cry_analysis": {
-            "model": f"{base}\\CryAnalysis_Model\\CryAnalysis_Model.keras",
-            "meta":  f"{base}\\CryAnalysis_Model\\CryAnalysis_Model_meta.json",
-            "type": "keras",
-        },
-        "fusion_hr_rr": {
-            "model": f"{base}\\Fusion_Model_HR_RR\\best_fusion_model.keras",
-            "meta":  f"{base}\\Fusion_Model_HR_RR\\best_fusion_model_meta.json",
-            "type": "keras",
-        },
-        "sleep_rules": {
-            "model": f"{base}\\SleepRules\\sleep_rules.py",
-            "meta":  f"{base}\\SleepRules\\sleep_rules_meta.json",
-            "type": "rule",
-        },
-        "temperature_rules": {
-            "model": f"{base}\\TemperatureRules\\temp_rules.py",
-            "meta":  f"{base}\\TemperatureRules\\temp_rules_meta.json",
-            "type": "rule",
-        },
-    }
+    paths = MODEL_PATHS
 
     for name, info in paths.items():
         m_path = info["model"]
@@ -80,7 +62,7 @@ def load_all_models():
                 print(f"❌ Failed loading {name}: {e}")
 
         else:
-            MODELS[name] = {"path": m_path, "meta": metadata}
+            MODELS[name] = {"path": m_path, "meta": metadata, "meta_path": meta}
             print(f"📄 Rule model registered: {name}")
 
     print("\n📦 Loaded Models:")
@@ -94,7 +76,7 @@ def load_all_models():
 # 🎧 معالجة الصوت
 # ============================================================
 
-def preprocess_audio(file_bytes):
+def audio_to_image(file_bytes):
     y, sr = librosa.load(io.BytesIO(file_bytes), sr=16000)
     S = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128, fmax=8000)
     S_db = librosa.power_to_db(S, ref=np.max)
@@ -103,8 +85,12 @@ def preprocess_audio(file_bytes):
 
     arr = Image.fromarray(np.stack([img, img, img], -1))
     arr = arr.resize((224, 224))
-    arr = np.array(arr, dtype=np.float32) / 255.0
-    return np.expand_dims(arr, 0)
+    # القنوات الثلاث متطابقة → نرجع قناة واحدة (224, 224) uint8
+    return np.array(arr)[..., 0]
+
+
+def preprocess_audio(file_bytes):
+    return to_model_input(audio_to_image(file_bytes)[None])
 
 
 # ============================================================
@@ -156,6 +142,11 @@ def save_hunger_history(child_id, cry_type, hunger_score):
         cur.close()
         conn.close()
 
+def save_history_rows(child_id, hr, rr, temp, cry_type):
+    save_sleep_history(child_id, hr, rr, "good")
+    save_temp_history(child_id, temp, "normal")
+    save_hunger_history(child_id, cry_type, 0.5)
+
 
 # ============================================================
 # 🚀 تشغيل Flask
@@ -164,10 +155,39 @@ def save_hunger_history(child_id, cry_type, hunger_score):
 app = Flask(__name__)
 CORS(app)
 
+# 🧵 لازم قبل تحميل أي موديل (قبل أول عملية TensorFlow)
+configure_tf_threads()
+
 print("🔧 Loading models...")
 MODELS = load_all_models()
 print("✅ All Models Loaded!")
 
+# 📐 محرك القواعد (sleep / temperature) — يُستخدم داخل analyze_child_state
+RULE_ENGINE = RuleEngine.from_paths(MODEL_PATHS)
+set_rule_engine(RULE_ENGINE)
+
+# 🗃️ نسخ الموديلات (hot-swap بدون إعادة تشغيل)
+MODEL_REGISTRY = ModelRegistry(MODEL_PATHS, MODELS)
+
+# 🚦 جدولة الاستدلال: حد تزامن لكل موديل + أولويات (realtime / backlog / batch)
+SCHEDULER = InferenceScheduler(MODEL_PATHS.keys())
+
+# 💽 مخزن ميزات البكاء (اختياري) — لإعادة التقييم بدون فك الصوت
+FEATURE_STORE_DIR = os.getenv("CHILDEYE_FEATURE_STORE_DIR")
+FEATURE_STORE = FeatureStore(FEATURE_STORE_DIR) if FEATURE_STORE_DIR else None
+
+# 🛰️ تقييم دوري لكل الأطفال (CHILDEYE_FLEET_TICK_SECONDS > 0 لتفعيله)
+FLEET = FleetTwin(on_change=save_states)
+FLEET_TICKER = FleetTicker(FLEET, connect=get_connection)
+
+
+def start_background_services():
+    # Threads do not survive fork(), so every serving process starts its own.
+    RULE_ENGINE.start_watcher()
+    MODEL_REGISTRY.start_watcher()
+    if os.getenv("CHILDEYE_WORKER_INDEX", "0") == "0":
+        FLEET_TICKER.start()
+
 
 # ============================================================
 # 📌 API: test & status
@@ -208,7 +228,45 @@ def status():
 
 @app.route("/test", methods=["GET"])
 def test():
-    return jsonify({"message": "Child-Eye Server is running!", "models": list(MODELS.keys())})
+    return jsonify({
+        "message": "Child-Eye Server is running!",
+        "models": list(MODELS.keys()),
+        "rules_version": RULE_ENGINE.version,
+        "model_versions": {k: v.get("version") for k, v in MODELS.items() if "version" in v}
+    })
+
+
+# ============================================================
+# 📌 API: Model Versions (hot-swap / rollback)
+# ============================================================
+
+@app.route("/models", methods=["GET"])
+def list_model_versions():
+    return jsonify(MODEL_REGISTRY.versions())
+
+
+@app.route("/models/<name>/reload", methods=["POST"])
+def reload_model(name):
+    if name not in MODEL_REGISTRY.paths:
+        return jsonify({"error": f"Unknown model: {name}"}), 404
+    MODEL_REGISTRY.reload_async(name)
+    return jsonify({"status": "loading", "model": name})
+
+
+@app.route("/models/<name>/rollback", methods=["POST"])
+def rollback_model(name):
+    if name not in MODEL_REGISTRY.paths:
+        return jsonify({"error": f"Unknown model: {name}"}), 404
+    # الاختيار مشترك بين كل العمال (active.json) — الباقي يلحقون خلال ثوانٍ
+    version = MODEL_REGISTRY.rollback(name)
+    if version is None:
+        return jsonify({"error": "No previous version to roll back to"}), 409
+    return jsonify({"status": "rolled_back", "model": name, "version": version})
+
+
+@app.route("/scheduler/stats", methods=["GET"])
+def scheduler_stats():
+    return jsonify(SCHEDULER.stats())
 
 
 # ============================================================
@@ -217,6 +275,7 @@ def test():
 
 @app.route("/update_vitals", methods=["POST"])
 def update_vitals():
+    started_at = time.monotonic()
     try:
         data = request.json
         child_id = data.get("child_id", 1)
@@ -227,21 +286,7 @@ def update_vitals():
         cry = data.get("cry_type", "silence")
         emo = data.get("emotion", "neutral")
 
-        # 1) حفظ القراءة في vitals
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO vitals (child_id, heart_rate, resp_rate, temperature, cry_classification, emotion_status)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (child_id, hr, rr, temp, cry, emo))
-        conn.commit()
-
-        # 2) history tables
-        save_sleep_history(child_id, hr, rr, "good")
-        save_temp_history(child_id, temp, "normal")
-        save_hunger_history(child_id, cry, 0.5)
-
-        # 3) تحديث التوأم الرقمي
+        # 1) تحليل التوأم الرقمي (المرحلة السريعة — بدون أي I/O)
         twin_input = {
             "hr": hr,
             "rr": rr,
@@ -249,7 +294,28 @@ def update_vitals():
             "cry_emotion": cry,
             "face_emotion": emo
         }
-        twin_state = update_twin_from_models(MODELS, twin_input)
+        twin_state = analyze_twin_fast(twin_input, child_id=child_id, started_at=started_at)
+
+        # 2) حفظ القراءة في vitals (هذا ما يؤكده رد "saved")
+        conn = get_connection()
+        if conn is None:
+            raise RuntimeError("Database connection failed")
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("""
+                    INSERT INTO vitals (child_id, heart_rate, resp_rate, temperature, cry_classification, emotion_status)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (child_id, hr, rr, temp, cry, emo))
+                conn.commit()
+            finally:
+                cur.close()
+        finally:
+            conn.close()
+
+        # 3) فقط بعد نجاح الحفظ: جداول الـ history + التنبؤ + حفظ التوأم (المرحلة المؤجلة)
+        submit_twin_update(
+            twin_state, deferred_io=lambda: save_history_rows(child_id, hr, rr, temp, cry))
 
         return jsonify({
             "status": "saved",
@@ -260,22 +326,62 @@ def update_vitals():
         return jsonify({"error": str(e)})
 
 
+@app.route("/twin/<int:child_id>", methods=["GET"])
+def twin_state(child_id):
+    state = get_latest_state(child_id)
+    if state is None:
+        return jsonify({"status": "no_data"})
+    return jsonify(state)
+
+
+@app.route("/fleet/stale", methods=["GET"])
+def fleet_stale():
+    # The ticker runs in one process only; every worker reads its snapshot.
+    snapshot = read_stale_snapshot()
+    if snapshot is None:
+        return jsonify({"error": "fleet ticker is not running"}), 503
+    return jsonify(snapshot)
+
+
 # ============================================================
 # 📌 API: Cry Analysis (Upload Audio)
 # ============================================================
 
 @app.route("/predict/cry", methods=["POST"])
 def predict_cry():
+    started_at = time.monotonic()
     try:
         if "file" not in request.files:
             return jsonify({"error": "No file uploaded"}), 400
 
-        cry_model = MODELS["cry_analysis"]["model"]
-        meta = MODELS["cry_analysis"]["meta"]
         file = request.files["file"]
-
-        x = preprocess_audio(file.read())
-        preds = cry_model.predict(x, verbose=0)[0]
+        priority = request.form.get("priority") or request.headers.get("X-ChildEye-Priority", "realtime")
+        deadline_ms = request.form.get("deadline_ms", type=float)
+        if priority not in PRIORITIES:
+            return jsonify({"error": f"Unknown priority: {priority}"}), 400
+        raw = file.read()
+
+        if FEATURE_STORE is not None:
+            h = content_hash(raw)
+            child_id = request.form.get("child_id", type=int)
+            img = FEATURE_STORE.get(h)
+            if img is None:
+                img = audio_to_image(raw)
+                FEATURE_STORE.put(h, img, child_id=child_id)
+            elif not FEATURE_STORE.has(h, child_id):
+                # نفس المقطع من طفل آخر → يُسجَّل له بدون تخزين الصورة مرة ثانية
+                FEATURE_STORE.put(h, img, child_id=child_id)
+            x = to_model_input(img[None])
+        else:
+            x = preprocess_audio(raw)
+
+        # النسخة تبقى ثابتة طوال الطلب حتى لو تم تبديل الموديل أثناءه
+        with SCHEDULER.slot("cry_analysis", priority,
+                            deadline_ms / 1000 if deadline_ms else None, started_at), \
+                MODEL_REGISTRY.acquire("cry_analysis") as mv:
+            preds = mv.model.predict(x, verbose=0)[0]
+            meta = mv.meta
+            model_version = mv.version
         preds = preds / (np.sum(preds) + 1e-8)
 
         classes = meta.get("output_classes",
@@ -286,11 +392,14 @@ def predict_cry():
         result = {
             "cry_type": classes[top],
             "confidence": float(preds[top]),
-            "all_probs": {classes[i]: float(preds[i]) for i in range(len(preds))}
+            "all_probs": {classes[i]: float(preds[i]) for i in range(len(preds))},
+            "model_version": model_version
         }
 
         return jsonify(result)
 
+    except DeadlineExceeded as e:
+        return jsonify({"error": str(e), "shed": True}), 503
     except Exception as e:
         return jsonify({"error": str(e)})
 
@@ -299,6 +408,8 @@ def predict_cry():
 # ▶️ بدء التشغيل
 # ============================================================
 
+# Development server only — for production use `python serve_production.py`.
 if __name__ == "__main__":
+    start_background_services()
     print("🌍 Child-Eye Server running on port 5000...")
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,86 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+from feature_store import FeatureStore, content_hash, rescore
+
+CLASSES = ["hungry", "pain", "laugh", "noise", "cold_hot", "silence"]
+
+
+class _MeanModel:
+    """Stands in for a Keras model: class = mean pixel bucket."""
+
+    def predict(self, x, verbose=0):
+        assert x.dtype == np.float32 and x.shape[1:] == (224, 224, 3)
+        preds = np.zeros((len(x), len(CLASSES)), dtype=np.float32)
+        preds[np.arange(len(x)), (x.mean(axis=(1, 2, 3)) * 5.99).astype(int)] = 1.0
+        return preds
+
+
+def _clip(value):
+    return np.full((224, 224), value, dtype=np.uint8)
+
+
+def test_same_clip_from_two_children_is_stored_once_and_recorded_twice(tmp_path):
+    store = FeatureStore(str(tmp_path), chunk_rows=4)
+    h = content_hash(b"cry-1")
+    store.put(h, _clip(10), child_id=1)
+    store.put(h, _clip(10), child_id=2)
+    store.put(h, _clip(10), child_id=2)   # repeat upload → no new entry
+
+    assert store.rows == 1
+    assert len(store) == 2
+    assert store.has(h, 1) and store.has(h, 2) and not store.has(h, 3)
+    assert [e["row"] for e in store.entries(2)] == [0]
+
+    reopened = FeatureStore(str(tmp_path))
+    assert reopened.rows == 1
+    assert {e["child_id"] for e in reopened.recordings(h)} == {1, 2}
+
+
+def test_reads_are_read_only_maps(tmp_path):
+    store = FeatureStore(str(tmp_path), chunk_rows=4)
+    h = content_hash(b"cry-1")
+    store.put(h, _clip(7), child_id=1)
+
+    view = store.get(h)
+    assert view[0, 0] == 7
+    assert not view.flags.writeable
+    with pytest.raises(ValueError):
+        view[0, 0] = 1
+
+    # A store opened only for reading never maps a chunk read-write.
+    reader = FeatureStore(str(tmp_path))
+    assert reader.get(h)[0, 0] == 7
+    assert reader._write_chunks == {}
+
+
+def test_rows_written_by_another_store_become_visible(tmp_path):
+    writer = FeatureStore(str(tmp_path), chunk_rows=4)
+    reader = FeatureStore(str(tmp_path))
+    for i in range(6):
+        writer.put(content_hash(bytes([i])), _clip(i), child_id=i % 2)
+    assert reader.get(content_hash(bytes([5])))[0, 0] == 5
+    assert reader.has(content_hash(bytes([4])), 0)
+
+
+def test_rescore_scores_each_clip_once_and_reports_every_child(tmp_path):
+    store = FeatureStore(str(tmp_path), chunk_rows=4)
+    values = [0, 60, 120, 250, 30, 200]
+    for i, v in enumerate(values):
+        store.put(content_hash(bytes([i])), _clip(v), child_id=1)
+    shared = content_hash(bytes([3]))
+    store.put(shared, _clip(250), child_id=2)
+
+    out = io.StringIO()
+    assert rescore(store, _MeanModel(), CLASSES, batch_size=3, out=out) == len(values)
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert len(rows) == len(values) + 1
+    assert sorted(r["child_id"] for r in rows if r["hash"] == shared) == [1, 2]
+
+    out = io.StringIO()
+    assert rescore(store, _MeanModel(), CLASSES, child_id=2, out=out) == 1
+    row = json.loads(out.getvalue())
+    assert row["child_id"] == 2 and row["cry_type"] == "silence"
@@ -0,0 +1,45 @@
+import os
+import time
+
+from file_lock import FileLock
+
+
+def _age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_stale_lock_is_broken(tmp_path):
+    path = str(tmp_path / "x.lock")
+    open(path, "w").close()
+    _age(path, 60)
+    with FileLock(path, stale_after=30):
+        assert os.path.exists(path)
+    assert not os.path.exists(path)
+
+
+def test_a_lock_taken_after_the_stale_one_was_seen_is_not_removed(tmp_path):
+    path = str(tmp_path / "x.lock")
+    open(path, "w").close()
+    _age(path, 60)
+    seen = b""
+
+    # Another waiter broke the stale lock and now holds a new one.
+    os.remove(path)
+    holder = FileLock(path).__enter__()
+    late = FileLock(path)
+    late._break(seen)
+
+    assert os.path.exists(path)
+    holder.__exit__(None, None, None)
+    assert not os.path.exists(path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_release_leaves_a_lock_that_replaced_ours(tmp_path):
+    path = str(tmp_path / "x.lock")
+    lock = FileLock(path).__enter__()
+    os.remove(path)                      # broken as stale by another waiter
+    with FileLock(path):
+        lock.__exit__(None, None, None)
+        assert os.path.exists(path)
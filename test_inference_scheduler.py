@@ -0,0 +1,136 @@
+import time
+import threading
+
+import pytest
+
+from inference_scheduler import ClassStats, DeadlineExceeded, InferenceScheduler
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+def _queued(scheduler, name):
+    return len(scheduler._gates[name].queue)
+
+
+def test_waiting_requests_are_admitted_by_priority_then_fifo():
+    scheduler = InferenceScheduler(["cry_analysis"], default_limit=1)
+    order = []
+    threads = []
+
+    def request(tag, priority):
+        with scheduler.slot("cry_analysis", priority, deadline=30):
+            order.append(tag)
+
+    with scheduler.slot("cry_analysis", "realtime"):
+        # Queue them worst-first so arrival order alone would give the wrong answer.
+        for tag, priority in [("batch-1", "batch"), ("backlog-1", "backlog"),
+                              ("batch-2", "batch"), ("realtime-1", "realtime"),
+                              ("realtime-2", "realtime")]:
+            t = threading.Thread(target=request, args=(tag, priority))
+            t.start()
+            threads.append(t)
+            _wait_for(lambda n=len(threads): _queued(scheduler, "cry_analysis") == n)
+
+    for t in threads:
+        t.join(timeout=5)
+    assert order == ["realtime-1", "realtime-2", "backlog-1", "batch-1", "batch-2"]
+
+
+def test_concurrency_cap_is_respected():
+    scheduler = InferenceScheduler(["cry_analysis"], default_limit=2)
+    lock = threading.Lock()
+    running = peak = 0
+
+    def request():
+        nonlocal running, peak
+        with scheduler.slot("cry_analysis", "batch"):
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.01)
+            with lock:
+                running -= 1
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+    assert peak == 2
+    assert scheduler.stats()["classes"]["batch"]["admitted"] == 8
+
+
+def test_request_is_shed_when_its_deadline_passes_in_the_queue():
+    scheduler = InferenceScheduler(["cry_analysis"], default_limit=1)
+
+    with scheduler.slot("cry_analysis", "realtime"):
+        t0 = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            with scheduler.slot("cry_analysis", "batch", deadline=0.05):
+                pytest.fail("admitted past the concurrency cap")
+        assert time.monotonic() - t0 < 1.0
+        assert _queued(scheduler, "cry_analysis") == 0
+
+    stats = scheduler.stats()["classes"]["batch"]
+    assert stats["shed"] == 1
+    assert stats["queue_depth"] == 0
+    # The shed entry left the heap, so the gate still admits new work.
+    with scheduler.slot("cry_analysis", "batch", deadline=0.05):
+        pass
+
+
+def test_deadline_counts_from_request_start():
+    scheduler = InferenceScheduler(["cry_analysis"], default_limit=1)
+    with scheduler.slot("cry_analysis", "realtime"):
+        with pytest.raises(DeadlineExceeded):
+            with scheduler.slot("cry_analysis", "realtime", deadline=0.5,
+                                started_at=time.monotonic() - 1.0):
+                pass
+
+
+def test_shed_head_does_not_block_lower_priority_requests():
+    scheduler = InferenceScheduler(["cry_analysis"], default_limit=1)
+    outcome = {}
+
+    def request(priority, deadline):
+        try:
+            with scheduler.slot("cry_analysis", priority, deadline=deadline):
+                outcome[priority] = "admitted"
+        except DeadlineExceeded:
+            outcome[priority] = "shed"
+
+    with scheduler.slot("cry_analysis", "realtime"):
+        batch = threading.Thread(target=request, args=("batch", 30))
+        batch.start()
+        _wait_for(lambda: _queued(scheduler, "cry_analysis") == 1)
+        realtime = threading.Thread(target=request, args=("realtime", 0.05))
+        realtime.start()
+        realtime.join(timeout=5)
+
+    batch.join(timeout=5)
+    assert outcome == {"realtime": "shed", "batch": "admitted"}
+
+
+def test_unknown_priority_is_rejected():
+    scheduler = InferenceScheduler(["cry_analysis"])
+    with pytest.raises(ValueError):
+        with scheduler.slot("cry_analysis", "urgent"):
+            pass
+
+
+def test_p95_uses_nearest_rank():
+    stats = ClassStats()
+    for ms in range(1, 11):
+        stats.record(ms / 1000)
+    assert stats.snapshot()["p95_wait_ms"] == 10.0
+
+    stats = ClassStats()
+    for ms in range(1, 101):
+        stats.record(ms / 1000)
+    assert stats.snapshot()["p95_wait_ms"] == 95.0
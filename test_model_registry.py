@@ -0,0 +1,95 @@
+import os
+import json
+import threading
+
+import pytest
+
+keras = pytest.importorskip("tensorflow").keras
+
+from model_registry import ModelRegistry
+
+
+def _save_model(path, units):
+    inp = keras.Input((4,))
+    keras.Model(inp, keras.layers.Dense(units)(inp)).save(path)
+
+
+def _bump_mtime(path, seconds):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + int(seconds * 1e9)))
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    path = str(tmp_path / "cry.keras")
+    _save_model(path, 2)
+    with open(tmp_path / "cry_meta.json", "w") as f:
+        json.dump({"output_classes": ["a", "b"]}, f)
+    return tmp_path
+
+
+def _worker(model_dir):
+    """One serving process: loads the file like load_all_models(), then the registry."""
+    paths = {"cry": {"model": str(model_dir / "cry.keras"),
+                     "meta": str(model_dir / "cry_meta.json"), "type": "keras"}}
+    models = {"cry": {"model": keras.models.load_model(paths["cry"]["model"]), "meta": {}}}
+    return ModelRegistry(paths, models, poll_seconds=0, sync_seconds=0)
+
+
+def test_reload_and_rollback_are_followed_by_every_worker(model_dir):
+    a, b = _worker(model_dir), _worker(model_dir)
+    v1 = a.current("cry").version
+    assert b.current("cry").version == v1
+
+    # Deploy a new file; one worker publishes it, the other follows on sync.
+    _save_model(str(model_dir / "cry.keras"), 3)
+    _bump_mtime(model_dir / "cry.keras", 5)
+    assert a.reload("cry")
+    v2 = a.current("cry").version
+    assert v2 != v1
+    b.sync(block=True)
+    assert b.current("cry").version == v2
+    assert b.current("cry").model.output_shape[-1] == 3
+
+    # Roll back on worker b; worker a follows from its in-memory previous.
+    assert b.rollback("cry") == v1
+    assert b.current("cry").version == v1
+    a.sync(block=True)
+    assert a.current("cry").version == v1
+    assert a.versions()["cry"]["shared"] == {"current": v1, "previous": v2}
+
+
+def test_restarted_worker_keeps_the_rolled_back_version(model_dir):
+    a = _worker(model_dir)
+    v1 = a.current("cry").version
+    _save_model(str(model_dir / "cry.keras"), 3)
+    _bump_mtime(model_dir / "cry.keras", 5)
+    a.reload("cry")
+    assert a.rollback("cry") == v1
+
+    # A SIGHUP re-fork loads the file on disk first, then the shared choice.
+    restarted = _worker(model_dir)
+    assert restarted.current("cry").version == v1
+    assert restarted.current("cry").model.output_shape[-1] == 2
+
+
+def test_watcher_publishes_a_new_file_once_it_is_stable(model_dir):
+    a, b = _worker(model_dir), _worker(model_dir)
+    _save_model(str(model_dir / "cry.keras"), 3)
+    _bump_mtime(model_dir / "cry.keras", 5)
+
+    a.check_for_changes()            # first sighting: wait for the file to settle
+    assert a.active("cry")["current"] == a.current("cry").version
+    a.check_for_changes()
+    for t in threading.enumerate():
+        if t.name == "reload-cry":
+            t.join(timeout=60)
+    v2 = a.current("cry").version
+    assert a.active("cry")["current"] == v2
+
+    b.check_for_changes()            # already published → nothing to do
+    b.check_for_changes()
+    b.sync(block=True)
+    assert b.current("cry").version == v2
+    snapshots = sorted(f for f in os.listdir(model_dir / "versions" / "cry") if f.endswith(".keras"))
+    assert len(snapshots) == 2
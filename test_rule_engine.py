@@ -0,0 +1,149 @@
+import os
+import json
+import itertools
+
+import numpy as np
+import pytest
+
+from rule_engine import RuleEngine
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BUNDLED_META = [
+    os.path.join(ROOT, "ChildEye_Models", "TemperatureRules", "temp_rules_meta.json"),
+    os.path.join(ROOT, "ChildEye_Models", "SleepRules", "sleep_rules_meta.json"),
+]
+
+
+def legacy_analyze_child_state(face_emotion=None, cry_emotion=None,
+                               hr=None, rr=None, temp=None, sleep_state=None):
+    # analyze_child_state as it was before the rule engine (digital_twin_core.py)
+    status = "normal"
+    reason = "stable and healthy"
+
+    if temp is not None:
+        if temp >= 39:
+            status, reason = "alert", "High fever (>39°C)"
+        elif temp >= 38:
+            status, reason = "warning", "Mild fever"
+        elif temp < 36:
+            status, reason = "warning", "Low body temperature"
+
+    if hr and rr:
+        if hr > 140 or rr > 45:
+            status, reason = "alert", "High HR/RR → stress or pain"
+        elif hr < 90 or rr < 20:
+            status, reason = "warning", "Low HR/RR → deep sleep"
+
+    if face_emotion:
+        if face_emotion == "cry":
+            status, reason = "alert", "Face shows crying/distress"
+        elif face_emotion == "sleep":
+            status, reason = "sleeping", "Eyes closed, calm expression"
+
+    if cry_emotion:
+        if cry_emotion in ["pain", "discomfort"]:
+            status, reason = "alert", "Cry indicates pain"
+        elif cry_emotion == "hungry":
+            status, reason = "warning", "Cry indicates hunger"
+        elif cry_emotion == "laugh":
+            reason = "Baby laughing → positive mood"
+
+    match_count = 0
+    if face_emotion == "cry" and cry_emotion in ["pain"]:
+        match_count += 1
+    if temp and temp > 38 and "fever" in reason:
+        match_count += 1
+
+    confidence = min(0.8 + (match_count * 0.05), 0.99)
+    return {"status": status, "reason": reason, "confidence": round(confidence, 2)}
+
+
+FACES = [None, "", "cry", "sleep", "happy", "neutral"]
+CRIES = [None, "", "pain", "discomfort", "hungry", "laugh", "tired", "silence"]
+# Boundary values of every threshold, plus None / 0 (falsy in the old code).
+HRS = [None, 0, 89, 90, 140, 141]
+RRS = [None, 0, 19, 20, 45, 46]
+TEMPS = [None, 0, 35.9, 36.0, 37.9, 38.0, 38.1, 39.0]
+
+
+def _assert_same(engine, kwargs):
+    got = engine.analyze(**kwargs)
+    want = legacy_analyze_child_state(**kwargs)
+    assert got["status"] == want["status"], kwargs
+    assert got["reason"] == want["reason"], kwargs
+    assert round(got["confidence"], 2) == want["confidence"], kwargs
+
+
+@pytest.mark.parametrize("meta_paths", [[], BUNDLED_META], ids=["defaults", "bundled-meta"])
+def test_analyze_matches_legacy_thresholds(meta_paths):
+    engine = RuleEngine(meta_paths)
+    for face, cry, hr, rr, temp in itertools.product(FACES, CRIES, HRS, RRS, TEMPS):
+        _assert_same(engine, {"face_emotion": face, "cry_emotion": cry,
+                              "hr": hr, "rr": rr, "temp": temp, "sleep_state": "awake"})
+
+
+def test_evaluate_batch_matches_legacy_on_random_readings():
+    rng = np.random.default_rng(0)
+    readings = [{
+        "face_emotion": FACES[rng.integers(len(FACES))],
+        "cry_emotion": CRIES[rng.integers(len(CRIES))],
+        "hr": None if rng.random() < 0.1 else int(rng.integers(60, 180)),
+        "rr": None if rng.random() < 0.1 else int(rng.integers(10, 60)),
+        "temp": None if rng.random() < 0.1 else round(float(rng.uniform(34.5, 40.5)), 1),
+        "sleep_state": "awake",
+    } for _ in range(5000)]
+
+    out = RuleEngine().evaluate_batch(readings)
+    for i, r in enumerate(readings):
+        want = legacy_analyze_child_state(**r)
+        assert out["status"][i] == want["status"], r
+        assert out["reason"][i] == want["reason"], r
+        assert round(float(out["confidence"][i]), 2) == want["confidence"], r
+
+
+def test_meta_file_overrides_group_and_reloads(tmp_path):
+    meta = tmp_path / "temp_rules_meta.json"
+    meta.write_text(json.dumps({"rules": [
+        {"group": "temperature", "any": [["temp", ">=", 38.5]],
+         "status": "alert", "reason": "Fever"},
+    ]}), encoding="utf-8")
+    engine = RuleEngine([str(meta)])
+    assert engine.analyze(temp=38.6)["status"] == "alert"
+    assert engine.analyze(temp=38.2)["status"] == "normal"
+
+    meta.write_text(json.dumps({"rules": []}), encoding="utf-8")
+    os.utime(meta, ns=(0, 0))
+    assert engine.check_for_changes()
+    _assert_same(engine, {"temp": 38.2})
+
+
+def test_broken_meta_at_startup_falls_back_to_default_rules(tmp_path):
+    meta = tmp_path / "temp_rules_meta.json"
+    meta.write_text('{"rules": [{"group": "temperature", "any": [["temp"', encoding="utf-8")
+    engine = RuleEngine([str(meta)])
+    _assert_same(engine, {"temp": 38.2})
+
+    meta.write_text(json.dumps({"rules": [
+        {"group": "temperature", "any": [["temp", ">=", 38.5]],
+         "status": "alert", "reason": "Fever"},
+    ]}), encoding="utf-8")
+    assert engine.check_for_changes()
+    assert engine.analyze(temp=38.6)["status"] == "alert"
+
+
+def test_failed_reload_keeps_the_version_and_is_retried(tmp_path):
+    meta = tmp_path / "temp_rules_meta.json"
+    meta.write_text(json.dumps({"rules": []}), encoding="utf-8")
+    engine = RuleEngine([str(meta)])
+
+    meta.write_text(json.dumps({"rules": [{"any": [["pulse", ">", 1]]}]}), encoding="utf-8")
+    os.utime(meta, ns=(0, 1))
+    assert not engine.check_for_changes()
+    assert engine.version == 0
+    assert not engine.check_for_changes()     # still pending, not forgotten
+
+    meta.write_text(json.dumps({"rules": []}), encoding="utf-8")
+    os.utime(meta, ns=(0, 1))                 # fixed within the same mtime
+    assert engine.check_for_changes()
+    assert engine.version == 1
+    assert not engine.check_for_changes()
@@ -0,0 +1,163 @@
+from datetime import datetime
+
+import numpy as np
+
+from vitals_retention import (TABLES, _merge, archive_path, archive_table, load_archive,
+                              partition_ddl, query_archive, rows_to_columns, write_archive)
+
+TABLE = "hunger_history"
+MONTH = datetime(2026, 1, 1)
+
+
+def _row(id, second, score=120.0, cry_type="hungry"):
+    row = {"id": id, "child_id": 5, "timestamp": datetime(2026, 1, 3, 8, 0, second)}
+    row.update({c: score for c in TABLES[TABLE]["numeric"]})
+    row.update({c: cry_type for c in TABLES[TABLE]["categorical"]})
+    return row
+
+
+def _archive(tmp_path, rows):
+    path = archive_path(TABLE, 5, MONTH, str(tmp_path))
+    cols = rows_to_columns(TABLE, rows)
+    try:
+        cols = _merge(TABLE, load_archive(path), cols)
+    except FileNotFoundError:
+        pass
+    write_archive(path, cols)
+    return load_archive(path)
+
+
+def test_identical_readings_survive_and_rerun_does_not_duplicate(tmp_path):
+    rows = [_row(1, 0), _row(2, 0), _row(3, 1)]   # ids 1 and 2 are the same reading twice
+    _archive(tmp_path, rows)
+    cols = _archive(tmp_path, rows[1:] + [_row(4, 2)])   # crash + rerun, plus one new row
+
+    assert cols["id"].tolist() == [1, 2, 3, 4]
+    out = query_archive(TABLE, 5, archive_dir=str(tmp_path))
+    assert len(out["timestamp"]) == 4
+
+
+def test_null_and_empty_text_stay_distinct(tmp_path):
+    _archive(tmp_path, [_row(1, 0, cry_type=None), _row(2, 1, cry_type="")])
+    _archive(tmp_path, [_row(3, 2, cry_type="pain")])
+
+    text = TABLES[TABLE]["categorical"][0]
+    out = query_archive(TABLE, 5, archive_dir=str(tmp_path), columns=[text])
+    assert out[text].tolist() == [None, "", "pain"]
+
+
+def test_null_numbers_round_trip_as_nan(tmp_path):
+    _archive(tmp_path, [_row(1, 0, score=None), _row(2, 1, score=99.5)])
+    num = TABLES[TABLE]["numeric"][0]
+    out = query_archive(TABLE, 5, archive_dir=str(tmp_path), columns=[num])
+    assert np.isnan(out[num][0]) and out[num][1] == np.float32(99.5)
+
+
+def test_partition_expression_follows_the_column_type():
+    now = datetime(2026, 2, 10)
+    ddl = partition_ddl(TABLE, MONTH, "timestamp", now=now)
+    assert "RANGE (UNIX_TIMESTAMP(timestamp))" in ddl
+    assert "p202601 VALUES LESS THAN (UNIX_TIMESTAMP('2026-02-01 00:00:00'))" in ddl
+    assert "TO_DAYS" not in ddl
+
+    ddl = partition_ddl(TABLE, MONTH, "datetime", now=now)
+    assert "RANGE (TO_DAYS(timestamp))" in ddl
+    assert "p202604 VALUES LESS THAN (TO_DAYS('2026-05-01'))" in ddl
+
+
+class _Table:
+    """Just enough of one partitioned MySQL table for archive_table()."""
+
+    def __init__(self, rows, partitions):
+        self.rows = rows
+        self.partitions = partitions
+        self.dropped = []
+        self.deletes = []
+
+
+class _Cursor:
+
+    def __init__(self, table, dictionary=False):
+        self.t = table
+        self.dictionary = dictionary
+        self.result = []
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        rows = self.t.rows
+        if sql.startswith("SELECT DISTINCT child_id"):
+            self.result = [{"child_id": c, "month": m} for c, m in
+                           {(r["child_id"], r["timestamp"].strftime("%Y-%m-01"))
+                            for r in rows if r["timestamp"] < params[0]}]
+        elif sql.startswith("SELECT id, child_id"):
+            child_id, start, end = params
+            self.result = sorted((dict(r) for r in rows if r["child_id"] == child_id
+                                  and start <= r["timestamp"] < end),
+                                 key=lambda r: (r["timestamp"], r["id"]))
+        elif sql.startswith("DELETE"):
+            assert " id IN " in sql
+            self.t.deletes.append(params)
+            self.t.rows = [r for r in rows if r["id"] not in params]
+        elif "information_schema.PARTITIONS" in sql:
+            self.result = [(p,) for p in self.t.partitions]
+        elif " PARTITION (" in sql:
+            month = datetime.strptime(sql.split("PARTITION (p")[1][:6], "%Y%m")
+            self.result = [(1,) for r in rows if r["timestamp"].strftime("%Y%m") == f"{month:%Y%m}"]
+        elif "DROP PARTITION" in sql:
+            name = sql.rsplit(" ", 1)[1]
+            self.t.dropped.append(name)
+            self.t.partitions.remove(name)
+        elif "REORGANIZE" in sql or "information_schema.COLUMNS" in sql:
+            self.result = [("timestamp",)]
+        else:
+            raise AssertionError(sql)
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def close(self):
+        pass
+
+
+class _Conn:
+
+    def __init__(self, table):
+        self.t = table
+
+    def cursor(self, dictionary=False):
+        return _Cursor(self.t, dictionary)
+
+    def commit(self):
+        pass
+
+
+def test_archive_table_keeps_null_children_and_deletes_only_archived_ids(tmp_path):
+    rows = [_row(1, 0), _row(2, 1), dict(_row(3, 2), child_id=None),
+            dict(_row(4, 3), timestamp=datetime(2026, 2, 20))]   # after the cutoff
+    table = _Table(rows, ["p202601", "p202602", "pmax"])
+    archived = archive_table(_Conn(table), TABLE, datetime(2026, 2, 10), archive_dir=str(tmp_path))
+
+    assert archived == 3
+    assert [r["id"] for r in table.rows] == [4]
+    assert sorted(i for d in table.deletes for i in d) == [1, 2, 3]
+    assert table.dropped == ["p202601"]
+    assert query_archive(TABLE, None, archive_dir=str(tmp_path))["timestamp"].size == 1
+
+
+def test_partition_with_unarchived_rows_is_not_dropped(tmp_path, monkeypatch):
+    table = _Table([_row(1, 0)], ["p202601", "pmax"])
+    original = _Cursor.execute
+
+    def execute(self, sql, params=()):
+        # A row of the same month arrives between the archive and the drop.
+        if "PARTITION (p202601)" in sql and not any(r["id"] == 9 for r in self.t.rows):
+            self.t.rows.append(_row(9, 5))
+        return original(self, sql, params)
+
+    monkeypatch.setattr(_Cursor, "execute", execute)
+    archive_table(_Conn(table), TABLE, datetime(2026, 3, 1), archive_dir=str(tmp_path))
+    assert table.dropped == []
+    assert [r["id"] for r in table.rows] == [9]
@@ -0,0 +1,432 @@
+# ============================================================
+# 🗄️ Child-Eye Vitals Retention — Monthly Columnar Archives
+# ============================================================
+#
+# Keeps `vitals` and the three history tables small: whole months older
+# than the retention age are moved out of MySQL into one columnar archive
+# per (table, child, month):
+#
+#   <ARCHIVE_DIR>/<table>/child_<id>/<YYYY-MM>.npz
+#
+# Each column is its own array: the row `id` as int64, timestamps as
+# datetime64[s], numbers as float32 (NaN = NULL), text columns
+# dictionary-encoded as small integer codes + a `<col>__categories` array
+# (code 0 = NULL, so NULL and "" stay distinct). Members are stored
+# uncompressed inside the .npz so query_archive() can memory-map them; set
+# CHILDEYE_ARCHIVE_COMPRESS=1 for deflate (smaller, but read into RAM).
+#
+#   python vitals_retention.py archive [--days 90] [--dry-run]
+#   python vitals_retention.py partition --table vitals [--apply]
+
+import os
+import struct
+import zipfile
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from db_connection import get_connection
+
+# ============================================================
+# 🔹 الإعدادات
+# ============================================================
+
+ARCHIVE_DIR = os.getenv("CHILDEYE_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+RETENTION_DAYS = int(os.getenv("CHILDEYE_RETENTION_DAYS", "90"))
+COMPRESS = os.getenv("CHILDEYE_ARCHIVE_COMPRESS", "0") == "1"
+
+ID_COLUMN = "id"
+DELETE_BATCH = 1000
+TIME_COLUMN = "timestamp"
+
+TABLES = {
+    "vitals": {
+        "numeric": ["heart_rate", "resp_rate", "temperature"],
+        "categorical": ["cry_classification", "emotion_status"],
+    },
+    "sleep_history": {
+        "numeric": ["heart_rate", "resp_rate"],
+        "categorical": ["sleep_state"],
+    },
+    "temp_history": {
+        "numeric": ["temperature"],
+        "categorical": ["temp_state"],
+    },
+    "hunger_history": {
+        "numeric": ["hunger_score"],
+        "categorical": ["cry_type"],
+    },
+}
+
+
+# ============================================================
+# 📅 أدوات الأشهر
+# ============================================================
+
+def month_start(dt):
+    return datetime(dt.year, dt.month, 1)
+
+
+def next_month(dt):
+    return datetime(dt.year + (dt.month // 12), dt.month % 12 + 1, 1)
+
+
+def archive_cutoff(days=RETENTION_DAYS, now=None):
+    """Only whole months that ended before now - days are archived."""
+    return month_start((now or datetime.now()) - timedelta(days=days))
+
+
+def archive_path(table, child_id, month, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, table, f"child_{child_id}", f"{month:%Y-%m}.npz")
+
+
+# ============================================================
+# 🧱 تحويل الصفوف إلى أعمدة
+# ============================================================
+
+def _encode(values):
+    """Object array of str/None → (codes, categories); code 0 is NULL."""
+    present = np.array([v is not None for v in values], dtype=bool)
+    categories, inverse = np.unique(
+        np.array([str(v) for v in values[present]], dtype=str), return_inverse=True)
+    dtype = np.uint8 if len(categories) < 256 else np.uint16
+    codes = np.zeros(len(values), dtype=dtype)
+    codes[present] = inverse + 1
+    return codes, categories
+
+
+def rows_to_columns(table, rows):
+    spec = TABLES[table]
+    cols = {
+        ID_COLUMN: np.array([r[ID_COLUMN] for r in rows], dtype=np.int64),
+        TIME_COLUMN: np.array([r[TIME_COLUMN] for r in rows], dtype="datetime64[s]"),
+    }
+    for name in spec["numeric"]:
+        cols[name] = np.array(
+            [np.nan if r.get(name) is None else float(r[name]) for r in rows], dtype=np.float32)
+    for name in spec["categorical"]:
+        values = np.array([r.get(name) for r in rows] + [None], dtype=object)[:-1]
+        cols[name], cols[f"{name}__categories"] = _encode(values)
+    return cols
+
+
+def decode(cols, name):
+    """Text column back to an object array of str, None where the DB had NULL."""
+    codes = np.asarray(cols[name])
+    categories = np.asarray(cols[f"{name}__categories"])
+    out = np.full(len(codes), None, dtype=object)
+    present = codes > 0
+    out[present] = categories[codes[present] - 1]
+    return out
+
+
+def _merge(table, old, new):
+    # Re-running after a crash between write and delete must not duplicate
+    # rows; rows are the same row only if their DB `id` is the same.
+    spec = TABLES[table]
+    merged = {c: np.concatenate([np.asarray(old[c]), np.asarray(new[c])])
+              for c in [ID_COLUMN, TIME_COLUMN] + spec["numeric"]}
+    for name in spec["categorical"]:
+        merged[name] = np.concatenate([decode(old, name), decode(new, name)])
+
+    _, first = np.unique(merged[ID_COLUMN], return_index=True)
+    keep = first[np.lexsort((merged[ID_COLUMN][first], merged[TIME_COLUMN][first]))]
+
+    cols = {c: merged[c][keep] for c in [ID_COLUMN, TIME_COLUMN] + spec["numeric"]}
+    for name in spec["categorical"]:
+        cols[name], cols[f"{name}__categories"] = _encode(merged[name][keep])
+    return cols
+
+
+def write_archive(path, cols, compress=COMPRESS):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        (np.savez_compressed if compress else np.savez)(f, **cols)
+    os.replace(tmp, path)
+
+
+# ============================================================
+# 🗺️ قراءة الأرشيف عبر memory map
+# ============================================================
+
+def load_archive(path):
+    """{column: array}; uncompressed members are np.memmap views of the file."""
+    out = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as member:
+                    out[name] = np.lib.format.read_array(member)
+                continue
+
+            f.seek(info.header_offset)
+            local = f.read(30)
+            name_len, extra_len = struct.unpack("<HH", local[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+
+            if dtype.hasobject or int(np.prod(shape)) == 0:
+                f.seek(info.header_offset + 30 + name_len + extra_len)
+                out[name] = np.lib.format.read_array(f, allow_pickle=False)
+                continue
+            out[name] = np.memmap(path, dtype=dtype, mode="r", shape=shape,
+                                  offset=f.tell(), order="F" if fortran else "C")
+    return out
+
+
+def iter_archive_months(table, child_id, start=None, end=None, archive_dir=ARCHIVE_DIR):
+    folder = os.path.join(archive_dir, table, f"child_{child_id}")
+    if not os.path.isdir(folder):
+        return
+    for fname in sorted(os.listdir(folder)):
+        if not fname.endswith(".npz"):
+            continue
+        month = datetime.strptime(fname[:-4], "%Y-%m")
+        if start is not None and next_month(month) <= start:
+            continue
+        if end is not None and month >= end:
+            continue
+        yield month, load_archive(os.path.join(folder, fname))
+
+
+def query_archive(table, child_id, start=None, end=None, columns=None, archive_dir=ARCHIVE_DIR):
+    """Archived rows of one child in [start, end) as {column: array}.
+
+    Only the selected rows are copied out of the memory-mapped files;
+    text columns are returned decoded.
+    """
+    spec = TABLES[table]
+    wanted = columns or spec["numeric"] + spec["categorical"]
+    parts = {TIME_COLUMN: []}
+    parts.update({c: [] for c in wanted})
+
+    for _, cols in iter_archive_months(table, child_id, start, end, archive_dir):
+        ts = cols[TIME_COLUMN]
+        mask = np.ones(len(ts), dtype=bool)
+        if start is not None:
+            mask &= ts >= np.datetime64(start, "s")
+        if end is not None:
+            mask &= ts < np.datetime64(end, "s")
+        parts[TIME_COLUMN].append(np.asarray(ts[mask]))
+        for c in wanted:
+            values = decode(cols, c) if c in spec["categorical"] else cols[c]
+            parts[c].append(np.asarray(values[mask]))
+
+    return {
+        c: np.concatenate(v) if v else np.array([], dtype="datetime64[s]" if c == TIME_COLUMN else np.float32)
+        for c, v in parts.items()
+    }
+
+
+# ============================================================
+# 🧩 تقسيم الجداول حسب الشهر (MySQL RANGE partitions)
+# ============================================================
+#
+# MySQL requires the partitioning column in every unique key, so the
+# primary key must be (id, timestamp) before partition_ddl() can be applied.
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def partition_expr(column_type):
+    # MySQL only accepts UNIX_TIMESTAMP() on a TIMESTAMP column (TO_DAYS is
+    # rejected there); DATE / DATETIME columns use TO_DAYS().
+    if column_type.lower() == "timestamp":
+        return f"UNIX_TIMESTAMP({TIME_COLUMN})"
+    return f"TO_DAYS({TIME_COLUMN})"
+
+
+def partition_bound(month, column_type):
+    if column_type.lower() == "timestamp":
+        return f"UNIX_TIMESTAMP('{month:%Y-%m-%d} 00:00:00')"
+    return f"TO_DAYS('{month:%Y-%m-%d}')"
+
+
+def time_column_type(cur, table):
+    cur.execute("""
+        SELECT DATA_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, TIME_COLUMN))
+    row = cur.fetchone()
+    if row is None:
+        raise ValueError(f"{table}.{TIME_COLUMN} not found")
+    return row[0].decode() if isinstance(row[0], (bytes, bytearray)) else row[0]
+
+
+def partition_ddl(table, first_month, column_type="timestamp", months_ahead=2, now=None):
+    now = now or datetime.now()
+    parts = []
+    month = month_start(first_month)
+    last = month_start(now)
+    for _ in range(months_ahead):
+        last = next_month(last)
+    while month <= last:
+        parts.append(f"PARTITION {partition_name(month)} VALUES LESS THAN "
+                     f"({partition_bound(next_month(month), column_type)})")
+        month = next_month(month)
+    parts.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return (f"ALTER TABLE {table} PARTITION BY RANGE ({partition_expr(column_type)}) (\n    "
+            + ",\n    ".join(parts) + "\n)")
+
+
+def existing_partitions(cur, table):
+    cur.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+    """, (table,))
+    return {row[0] for row in cur.fetchall()}
+
+
+def ensure_future_partitions(cur, table, months_ahead=2, now=None):
+    """Split pmax so the next `months_ahead` months get their own partition."""
+    parts = existing_partitions(cur, table)
+    if "pmax" not in parts:
+        return []
+    month = next_month(month_start(now or datetime.now()))
+    added = []
+    for _ in range(months_ahead):
+        if partition_name(month) not in parts:
+            added.append(month)
+        month = next_month(month)
+    if added:
+        column_type = time_column_type(cur, table)
+        defs = ",\n    ".join(
+            f"PARTITION {partition_name(m)} VALUES LESS THAN ({partition_bound(next_month(m), column_type)})"
+            for m in added)
+        cur.execute(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO (\n    {defs},\n"
+                    f"    PARTITION pmax VALUES LESS THAN MAXVALUE)")
+    return added
+
+
+# ============================================================
+# 📦 الأرشفة
+# ============================================================
+
+def archive_table(conn, table, cutoff, archive_dir=ARCHIVE_DIR, dry_run=False):
+    spec = TABLES[table]
+    select_cols = ", ".join([ID_COLUMN, "child_id", TIME_COLUMN] + spec["numeric"] + spec["categorical"])
+    cur = conn.cursor(dictionary=True)
+    cur.execute(f"""
+        SELECT DISTINCT child_id, DATE_FORMAT({TIME_COLUMN}, '%Y-%m-01') AS month
+        FROM {table} WHERE {TIME_COLUMN} < %s
+    """, (cutoff,))
+    groups = [(r["child_id"], datetime.strptime(r["month"], "%Y-%m-%d")) for r in cur.fetchall()]
+
+    archived = 0
+    # NULL child_id rows are archived too (as child_None); <=> matches NULL.
+    for child_id, month in sorted(groups, key=lambda g: (g[0] is None, g[0] or 0, g[1])):
+        # The cutoff month is only archived up to the cutoff.
+        cur.execute(f"""
+            SELECT {select_cols} FROM {table}
+            WHERE child_id <=> %s AND {TIME_COLUMN} >= %s AND {TIME_COLUMN} < %s
+            ORDER BY {TIME_COLUMN}, {ID_COLUMN}
+        """, (child_id, month, min(next_month(month), cutoff)))
+        rows = cur.fetchall()
+        if not rows:
+            continue
+        path = archive_path(table, child_id, month, archive_dir)
+        print(f"📦 {table} child {child_id} {month:%Y-%m}: {len(rows)} rows → {path}")
+        if dry_run:
+            continue
+
+        cols = rows_to_columns(table, rows)
+        if os.path.exists(path):
+            cols = _merge(table, load_archive(path), cols)
+        write_archive(path, cols)
+
+        # الحذف بعد كتابة الملف فقط — وفقط الصفوف التي أُرشفت فعلاً
+        ids = [r[ID_COLUMN] for r in rows]
+        for i in range(0, len(ids), DELETE_BATCH):
+            batch = ids[i:i + DELETE_BATCH]
+            cur.execute(f"DELETE FROM {table} WHERE {ID_COLUMN} IN ({', '.join(['%s'] * len(batch))})",
+                        tuple(batch))
+        conn.commit()
+        archived += len(rows)
+
+    if not dry_run:
+        # Partitions that are now empty are dropped instead of left behind.
+        plain = conn.cursor()
+        for name in sorted(existing_partitions(plain, table)):
+            if name == "pmax":
+                continue
+            month = datetime.strptime(name[1:], "%Y%m")
+            if next_month(month) > cutoff:
+                continue
+            # Never drop rows that were not archived (e.g. inserted meanwhile).
+            plain.execute(f"SELECT 1 FROM {table} PARTITION ({name}) LIMIT 1")
+            if plain.fetchall():
+                print(f"⚠️ {table}: partition {name} still has rows, not dropped")
+                continue
+            plain.execute(f"ALTER TABLE {table} DROP PARTITION {name}")
+            print(f"🧹 {table}: dropped partition {name}")
+        ensure_future_partitions(plain, table)
+        plain.close()
+
+    cur.close()
+    return archived
+
+
+def run_retention(days=RETENTION_DAYS, tables=None, archive_dir=ARCHIVE_DIR, dry_run=False):
+    cutoff = archive_cutoff(days)
+    conn = get_connection()
+    if conn is None:
+        return None
+    summary = {}
+    try:
+        for table in tables or TABLES:
+            summary[table] = archive_table(conn, table, cutoff, archive_dir, dry_run)
+    finally:
+        conn.close()
+    print(f"✅ Retention done (cutoff {cutoff:%Y-%m-%d}): {summary}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Child-Eye vitals retention")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("archive", help="move old months into columnar archives")
+    p.add_argument("--days", type=int, default=RETENTION_DAYS)
+    p.add_argument("--table", action="append", choices=list(TABLES))
+    p.add_argument("--dry-run", action="store_true")
+
+    p = sub.add_parser("partition", help="print (or apply) monthly partition DDL")
+    p.add_argument("--table", required=True, choices=list(TABLES))
+    p.add_argument("--since", default=None, help="first month YYYY-MM (default: oldest row)")
+    p.add_argument("--apply", action="store_true")
+
+    args = parser.parse_args(argv)
+    if args.cmd == "archive":
+        run_retention(args.days, args.table, dry_run=args.dry_run)
+        return
+
+    conn = get_connection()
+    if conn is None:
+        return
+    cur = conn.cursor()
+    try:
+        if args.since:
+            first = datetime.strptime(args.since, "%Y-%m")
+        else:
+            cur.execute(f"SELECT MIN({TIME_COLUMN}) FROM {args.table}")
+            first = cur.fetchone()[0] or datetime.now()
+        ddl = partition_ddl(args.table, first, time_column_type(cur, args.table))
+        print(ddl)
+        if args.apply:
+            cur.execute(ddl)
+            print(f"✅ {args.table} partitioned by month")
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()